@@ -5,209 +5,729 @@ Args: event - dict with httpMethod, body, queryStringParameters
 Returns: HTTP response dict with statusCode, headers, body
 '''
 
+import base64
+import csv
+import gzip
+import io
 import json
+import math
 import os
-from typing import Dict, Any
+import re
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+from api import HttpError, Request, Router, encode_json, error_response, json_response
+from cache import ADMIN_STATUS_CHANNEL, TTLCache
+from db import InstrumentedTupleCursor
+from tokens import get_session_token, verify_session_token
+
+ADMIN_CACHE = TTLCache(
+    max_size=int(os.environ.get('ADMIN_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('ADMIN_CACHE_TTL', 30)),
+    channel=ADMIN_STATUS_CHANNEL
+)
 
 def check_admin(user_id: str, conn) -> bool:
+    ADMIN_CACHE.sync(conn)
+    hit, is_admin = ADMIN_CACHE.get(user_id)
+    if hit:
+        return is_admin
+    
     cur = conn.cursor()
     cur.execute("SELECT is_admin FROM users WHERE user_id = %s", (user_id,))
     user = cur.fetchone()
     cur.close()
-    return user and user['is_admin']
-
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = get_db_connection()
-    cur = None
     
+    is_admin = bool(user and user['is_admin'])
+    ADMIN_CACHE.set(user_id, is_admin)
+    return is_admin
+
+def encode_cursor(row) -> str:
+    payload = json.dumps([str(row['created_at']), row['id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    return str(created_at), int(row_id)
+
+LISTING_MAX = 500
+
+def parse_limit(value: Any, default: int, maximum: int) -> int:
     try:
-        headers = event.get('headers', {})
-        admin_id = headers.get('x-admin-id') or headers.get('X-Admin-Id')
+        limit = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        raise HttpError(400, 'limit must be an integer')
+    return max(1, min(limit, maximum))
+
+def fetch_page(cur, source: str, limit: int, cursor: Optional[Tuple[str, int]]) -> Tuple[List[Any], Optional[str]]:
+    if cursor:
+        cur.execute(
+            f"SELECT * FROM {source} WHERE (created_at, id) < (%s::timestamp, %s) ORDER BY created_at DESC, id DESC LIMIT %s",
+            (cursor[0], cursor[1], limit + 1)
+        )
+    else:
+        cur.execute(
+            f"SELECT * FROM {source} ORDER BY created_at DESC, id DESC LIMIT %s",
+            (limit + 1,)
+        )
+    rows = cur.fetchall()
+    
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+def count_rows(cur, table: str, mode: str) -> Optional[int]:
+    if mode == 'none':
+        return None
+    if mode == 'estimate':
+        cur.execute(
+            """SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint AS count FROM pg_class
+                WHERE oid = %s::regclass OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)""",
+            (table, table)
+        )
+        return max(cur.fetchone()['count'], 0)
+    if table == 'users':
+        cur.execute("SELECT COALESCE(SUM(value), 0)::bigint AS count FROM platform_stats WHERE name = 'total_users'")
+    else:
+        cur.execute(f"SELECT COUNT(*) AS count FROM {table}")
+    return cur.fetchone()['count']
+
+LISTING_SOURCES = {
+    'users': 'users_with_balance',
+    'transactions': 'transactions',
+}
+
+EXPORT_COLUMNS = ('id', 'user_id', 'type', 'amount', 'status', 'description', 'phone', 'bank', 'created_at')
+EXPORT_FETCH_SIZE = 5000
+EXPORT_MAX_ROWS = 200000
+PARTITIONS_AHEAD = int(os.environ.get('TRANSACTIONS_PARTITIONS_AHEAD', 3))
+RETAIN_MONTHS = int(os.environ.get('TRANSACTIONS_RETAIN_MONTHS', 12))
+ARCHIVE_CHUNK_ROWS = int(os.environ.get('TRANSACTIONS_ARCHIVE_CHUNK_ROWS', 50000))
+PARTITION_NAME = re.compile(r'^transactions_(\d{4})_(\d{2})$')
+
+def write_gzip_rows(conn, sql: str, args: List[Any], export_format: str, limit: Optional[int] = None,
+                    header: bool = True) -> Tuple[bytes, int, Optional[Tuple[Any, ...]], bool]:
+    buffer = io.BytesIO()
+    written = 0
+    last = None
+    has_more = False
+    
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as gz:
+        out = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+        writer = csv.writer(out)
+        if export_format == 'csv' and header:
+            writer.writerow(EXPORT_COLUMNS)
         
-        if not admin_id or not check_admin(admin_id, conn):
-            return {
-                'statusCode': 403,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Access denied'}),
-                'isBase64Encoded': False
-            }
+        with conn.cursor(name='transactions_export', cursor_factory=InstrumentedTupleCursor) as export_cur:
+            export_cur.itersize = EXPORT_FETCH_SIZE
+            export_cur.execute(sql, args)
+            for row in export_cur:
+                if written == limit:
+                    has_more = True
+                    break
+                if export_format == 'csv':
+                    writer.writerow(row)
+                else:
+                    out.write(encode_json(dict(zip(EXPORT_COLUMNS, row))))
+                    out.write('\n')
+                last = row
+                written += 1
         
-        cur = conn.cursor()
+        out.flush()
+        out.detach()
+    
+    return buffer.getvalue(), written, last, has_more
+
+def export_transactions(conn, params: Dict[str, Any], cursor: Optional[Tuple[str, int]]) -> Tuple[bytes, int, Optional[str]]:
+    export_format = params.get('format', 'csv')
+    limit = parse_limit(params.get('limit'), 50000, EXPORT_MAX_ROWS)
+    
+    conditions: List[str] = []
+    args: List[Any] = []
+    if params.get('from'):
+        conditions.append('created_at >= %s')
+        args.append(params['from'])
+    if params.get('to'):
+        conditions.append('created_at < %s')
+        args.append(params['to'])
+    if params.get('type'):
+        conditions.append('type = ANY(%s)')
+        args.append(params['type'].split(','))
+    if cursor:
+        conditions.append('(created_at, id) > (%s::timestamp, %s)')
+        args.extend(cursor)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM transactions {where} ORDER BY created_at, id LIMIT %s"
+    args.append(limit + 1)
+    
+    payload, written, last, has_more = write_gzip_rows(conn, sql, args, export_format, limit)
+    next_cursor = encode_cursor({'created_at': last[-1], 'id': last[0]}) if has_more else None
+    return payload, written, next_cursor
+
+def archivable_partitions(cur, retain_months: int) -> List[Tuple[str, date]]:
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - retain_months
+    cutoff = date(months // 12, months % 12 + 1, 1)
+    
+    # Month tables that are no longer attached were detached by an archive run that did not finish
+    cur.execute(
+        """SELECT c.relname AS name,
+                  EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid) AS attached
+             FROM pg_class c
+            WHERE c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'transactions'::regclass)
+              AND c.relkind = 'r' AND c.relname ~ '^transactions_[0-9]{4}_[0-9]{2}$'
+            ORDER BY c.relname"""
+    )
+    partitions: List[Tuple[str, date]] = []
+    for row in cur.fetchall():
+        match = PARTITION_NAME.match(row['name'])
+        if match:
+            month_start = date(int(match.group(1)), int(match.group(2)), 1)
+            if month_start < cutoff or not row['attached']:
+                partitions.append((row['name'], month_start))
+    return partitions
+
+# Withdrawals still in the payout queue must stay attached, or the worker can never settle them
+def unsettled_withdrawals(cur, partition_name: str) -> int:
+    cur.execute(
+        f"""SELECT COUNT(*) AS count FROM {partition_name}
+             WHERE type = 'withdraw' AND status IN ('pending', 'processing')"""
+    )
+    return cur.fetchone()['count']
+
+def archive_partition(conn, partition_name: str, month_start: date) -> Optional[int]:
+    cur = conn.cursor()
+    try:
+        # DETACH holds ACCESS EXCLUSIVE on transactions, so commit it before any of the export work.
+        # CONCURRENTLY is not an option while transactions_default exists.
+        cur.execute(
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass AND inhparent = 'transactions'::regclass",
+            (partition_name,)
+        )
+        if cur.fetchone():
+            cur.execute(f"ALTER TABLE transactions DETACH PARTITION {partition_name}")
+            if unsettled_withdrawals(cur, partition_name):
+                conn.rollback()
+                return None
+        conn.commit()
         
-        if method == 'GET':
-            params = event.get('queryStringParameters', {}) or {}
-            action = params.get('action')
-            
-            if action == 'users':
-                limit = int(params.get('limit', 50))
-                offset = int(params.get('offset', 0))
-                
-                cur.execute(
-                    "SELECT * FROM users ORDER BY created_at DESC LIMIT %s OFFSET %s",
-                    (limit, offset)
-                )
-                users = cur.fetchall()
-                
-                cur.execute("SELECT COUNT(*) as count FROM users")
-                total = cur.fetchone()['count']
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'users': [dict(u) for u in users],
-                        'total': total
-                    }, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'transactions':
-                limit = int(params.get('limit', 50))
-                offset = int(params.get('offset', 0))
-                
-                cur.execute(
-                    "SELECT * FROM transactions ORDER BY created_at DESC LIMIT %s OFFSET %s",
-                    (limit, offset)
-                )
-                transactions = cur.fetchall()
-                
-                cur.execute("SELECT COUNT(*) as count FROM transactions")
-                total = cur.fetchone()['count']
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'transactions': [dict(t) for t in transactions],
-                        'total': total
-                    }, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'stats':
-                cur.execute("SELECT COUNT(*) as count FROM users")
-                total_users = cur.fetchone()['count']
-                
-                cur.execute("SELECT SUM(balance) as total FROM users")
-                total_balance = cur.fetchone()['total'] or 0
-                
-                cur.execute("SELECT COUNT(*) as count FROM transactions WHERE type = 'withdraw' AND status = 'completed'")
-                total_withdrawals = cur.fetchone()['count']
-                
-                cur.execute("SELECT COUNT(*) as count FROM transactions WHERE type = 'topup' AND status = 'completed'")
-                total_topups = cur.fetchone()['count']
-                
-                cur.execute("SELECT COUNT(*) as count FROM referrals WHERE status = 'completed'")
-                total_referrals = cur.fetchone()['count']
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'totalUsers': total_users,
-                        'totalBalance': float(total_balance),
-                        'totalWithdrawals': total_withdrawals,
-                        'totalTopups': total_topups,
-                        'totalReferrals': total_referrals
-                    }),
-                    'isBase64Encoded': False
-                }
+        cur.execute(
+            f"""SELECT COUNT(*) FILTER (WHERE type = 'withdraw' AND status = 'completed') AS withdrawals,
+                       COUNT(*) FILTER (WHERE type = 'topup' AND status = 'completed') AS topups
+                  FROM {partition_name}"""
+        )
+        counts = cur.fetchone()
+        cur.execute(
+            """INSERT INTO transactions_archive (partition_name, month_start, rows_count, withdrawals, topups)
+               VALUES (%s, %s, 0, %s, %s)""",
+            (partition_name, month_start, counts['withdrawals'], counts['topups'])
+        )
         
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            action = body_data.get('action')
-            
-            if action == 'add_bonus':
-                user_id = body_data.get('userId')
-                amount = float(body_data.get('amount'))
-                bonus_type = body_data.get('type', 'card_bonus')
-                description = body_data.get('description', 'Бонус от администратора')
-                
-                if bonus_type == 'card_bonus':
-                    cur.execute(
-                        "UPDATE users SET balance = balance + %s, card_earnings = card_earnings + %s WHERE user_id = %s",
-                        (amount, amount, user_id)
-                    )
-                elif bonus_type == 'referral_bonus':
-                    cur.execute(
-                        "UPDATE users SET balance = balance + %s, referral_earnings = referral_earnings + %s WHERE user_id = %s",
-                        (amount, amount, user_id)
-                    )
-                else:
-                    cur.execute(
-                        "UPDATE users SET balance = balance + %s WHERE user_id = %s",
-                        (amount, user_id)
-                    )
-                
-                cur.execute(
-                    "INSERT INTO transactions (user_id, type, amount, status, description) VALUES (%s, %s, %s, %s, %s)",
-                    (user_id, bonus_type, amount, 'completed', description)
-                )
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Bonus added'}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'update_balance':
-                user_id = body_data.get('userId')
-                new_balance = float(body_data.get('balance'))
-                
-                cur.execute(
-                    "UPDATE users SET balance = %s WHERE user_id = %s",
-                    (new_balance, user_id)
-                )
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Balance updated'}),
-                    'isBase64Encoded': False
-                }
+        columns = ', '.join(EXPORT_COLUMNS)
+        written = 0
+        chunk_no = 0
+        last = None
+        while True:
+            if last is None:
+                sql, args = f"SELECT {columns} FROM {partition_name} ORDER BY created_at, id LIMIT %s", []
+            else:
+                sql = f"SELECT {columns} FROM {partition_name} WHERE (created_at, id) > (%s, %s) ORDER BY created_at, id LIMIT %s"
+                args = [last[-1], last[0]]
+            payload, chunk_rows, last, _ = write_gzip_rows(
+                conn, sql, args + [ARCHIVE_CHUNK_ROWS], 'csv', header=chunk_no == 0
+            )
+            if chunk_rows == 0 and chunk_no > 0:
+                break
+            cur.execute(
+                """INSERT INTO transactions_archive_chunks (partition_name, chunk_no, rows_count, data)
+                   VALUES (%s, %s, %s, %s)""",
+                (partition_name, chunk_no, chunk_rows, psycopg2.Binary(payload))
+            )
+            written += chunk_rows
+            chunk_no += 1
+            if chunk_rows < ARCHIVE_CHUNK_ROWS:
+                break
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        cur.execute("UPDATE transactions_archive SET rows_count = %s WHERE partition_name = %s", (written, partition_name))
+        cur.execute(f"DROP TABLE {partition_name}")
+        conn.commit()
+        return written
     finally:
-        if cur:
-            cur.close()
-        conn.close()
\ No newline at end of file
+        cur.close()
+
+TOP_REFERRERS_ORDER = {
+    'downline': 'downline_size',
+    'direct': 'direct_count',
+    'rewards': 'rewards',
+}
+TOP_REFERRERS_MAX = 100
+
+SEARCH_MAX = 50
+SEARCH_TEXT = 'users_search_text(user_id, username, first_name, last_name)'
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_users(cur, query: str, limit: int) -> List[Any]:
+    term = query.strip().lower()
+    prefix = escape_like(term) + '%'
+    # Prefix branches sort with ~<~ so the text_pattern_ops indexes serve both the LIKE and the ORDER BY
+    branches = [
+        "(SELECT id, 1 AS rank, 0::real AS distance FROM users WHERE lower(user_id) LIKE %s ORDER BY lower(user_id) USING ~<~ LIMIT %s)",
+        "(SELECT id, 1, 0::real FROM users WHERE lower(username) LIKE %s ORDER BY lower(username) USING ~<~ LIMIT %s)",
+    ]
+    args: List[Any] = [prefix, limit, prefix, limit]
+
+    if term.isascii() and term.isdigit() and len(term) <= 18:
+        branches.insert(0, "(SELECT id, 0, 0::real FROM users WHERE telegram_id = %s)")
+        args.insert(0, int(term))
+    if len(term) >= 3:
+        branches.append(
+            f"""(SELECT id, 2, {SEARCH_TEXT} <-> %s FROM users
+                  WHERE {SEARCH_TEXT} LIKE %s
+                  ORDER BY {SEARCH_TEXT} <-> %s LIMIT %s)"""
+        )
+        args.extend([term, '%' + escape_like(term) + '%', term, limit])
+
+    cur.execute(
+        f"""SELECT u.id, u.user_id, u.telegram_id, u.username, u.first_name, u.last_name, u.is_admin, u.created_at,
+                   b.balance, b.card_earnings, b.referral_earnings
+              FROM (SELECT id, MIN(rank) AS rank, MIN(distance) AS distance
+                      FROM ({' UNION ALL '.join(branches)}) AS matches
+                     GROUP BY id
+                     ORDER BY MIN(rank), MIN(distance), id
+                     LIMIT %s) AS m
+              JOIN users u ON u.id = m.id
+             CROSS JOIN LATERAL account_balance(u.user_id) b
+             ORDER BY m.rank, m.distance, u.id""",
+        args + [limit]
+    )
+    return cur.fetchall()
+
+ADJUSTMENT_DESCRIPTION = 'Корректировка баланса администратором'
+MAX_AMOUNT = 99999999.99
+BONUS_TYPES = ('card_bonus', 'referral_bonus', 'admin_bonus')
+
+def parse_bonus_type(value: Any) -> str:
+    bonus_type = value or 'card_bonus'
+    if bonus_type not in BONUS_TYPES:
+        raise HttpError(400, f"type must be one of {', '.join(BONUS_TYPES)}")
+    return bonus_type
+
+def parse_amount(value: Any, field: str, allow_zero: bool = False) -> float:
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        amount = math.nan
+    if not math.isfinite(amount) or amount < 0 or (amount == 0 and not allow_zero) or amount > MAX_AMOUNT:
+        raise HttpError(400, f'{field} must be a {"non-negative" if allow_zero else "positive"} number up to {MAX_AMOUNT}')
+    return amount
+
+def build_user_selector(body_data: Dict[str, Any]) -> Optional[Tuple[str, List[Any]]]:
+    conditions: List[str] = []
+    args: List[Any] = []
+    
+    user_ids = body_data.get('userIds')
+    if isinstance(user_ids, list) and user_ids:
+        conditions.append('user_id = ANY(%s)')
+        args.append([str(user_id) for user_id in user_ids])
+    
+    user_filter = body_data.get('filter')
+    if not isinstance(user_filter, dict):
+        user_filter = {}
+    if user_filter.get('createdAfter'):
+        conditions.append('created_at >= %s')
+        args.append(user_filter['createdAfter'])
+    if user_filter.get('createdBefore'):
+        conditions.append('created_at < %s')
+        args.append(user_filter['createdBefore'])
+    
+    if not conditions:
+        return None
+    return ' AND '.join(conditions), args
+
+def bulk_add_bonus(cur, where: str, args: List[Any], amount: float, bonus_type: str, description: str) -> int:
+    cur.execute(
+        f"""INSERT INTO transactions (user_id, type, amount, status, description)
+            SELECT user_id, %s, %s, 'completed', %s FROM users WHERE {where}""",
+        [bonus_type, amount, description, *args]
+    )
+    return cur.rowcount
+
+def bulk_update_balance(cur, where: str, args: List[Any], new_balance: float) -> int:
+    cur.execute(
+        f"""SELECT COUNT(*) AS count
+              FROM (SELECT user_id FROM users WHERE {where} ORDER BY user_id FOR NO KEY UPDATE) AS targets""",
+        args
+    )
+    affected = cur.fetchone()['count']
+    cur.execute(
+        f"""INSERT INTO transactions (user_id, type, amount, status, description)
+            SELECT u.user_id, 'adjustment', %s - b.balance, 'completed', %s
+              FROM users AS u CROSS JOIN LATERAL account_balance(u.user_id) AS b
+             WHERE {where} AND b.balance <> %s""",
+        [new_balance, ADJUSTMENT_DESCRIPTION, *args, new_balance]
+    )
+    return affected
+
+def read_platform_stats(cur) -> Dict[str, Any]:
+    cur.execute("SELECT name, SUM(value)::float8 AS value FROM platform_stats GROUP BY name")
+    stats = {row['name']: row['value'] for row in cur.fetchall()}
+    
+    return {
+        'totalUsers': int(stats.get('total_users', 0)),
+        'totalBalance': float(stats.get('total_balance', 0)),
+        'totalWithdrawals': int(stats.get('total_withdrawals', 0)),
+        'totalTopups': int(stats.get('total_topups', 0)),
+        'totalReferrals': int(stats.get('total_referrals', 0))
+    }
+
+def require_admin(request: Request) -> Optional[Dict[str, Any]]:
+    token = get_session_token(request.event)
+    
+    if token:
+        session = verify_session_token(token)
+        if not session:
+            return error_response(401, 'Invalid or expired session token')
+        is_admin = session['adm']
+    else:
+        admin_id = request.headers.get('x-admin-id')
+        is_admin = bool(admin_id) and check_admin(admin_id, request.conn)
+    
+    if not is_admin:
+        return error_response(403, 'Access denied')
+    return None
+
+def parse_cursor(params: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    if not params.get('cursor'):
+        return None
+    try:
+        return decode_cursor(params['cursor'])
+    except (ValueError, TypeError):
+        raise HttpError(400, 'Invalid cursor')
+
+router = Router(
+    'admin',
+    allow_methods='GET, POST, PUT, OPTIONS',
+    allow_headers='Content-Type, X-Admin-Id, X-Session-Token, X-Last-Write',
+    guard=require_admin
+)
+
+@router.route('GET', 'users')
+@router.route('GET', 'transactions')
+def get_listing(request: Request) -> Dict[str, Any]:
+    params = request.params
+    table = params['action']
+    limit = parse_limit(params.get('limit'), 50, LISTING_MAX)
+    total_mode = params.get('total', 'exact')
+    cursor = parse_cursor(params)
+    
+    cur = request.read_cursor()
+    rows, next_cursor = fetch_page(cur, LISTING_SOURCES[table], limit, cursor)
+    
+    return json_response({
+        table: rows,
+        'nextCursor': next_cursor,
+        'total': count_rows(cur, table, total_mode),
+        'totalEstimated': total_mode == 'estimate'
+    })
+
+@router.route('GET', 'export')
+def get_export(request: Request) -> Dict[str, Any]:
+    params = request.params
+    export_format = params.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        raise HttpError(400, 'format must be csv or ndjson')
+    
+    payload, rows_count, next_cursor = export_transactions(request.read_conn, params, parse_cursor(params))
+    
+    response_headers = {
+        'Content-Type': 'text/csv; charset=utf-8' if export_format == 'csv' else 'application/x-ndjson',
+        'Content-Encoding': 'gzip',
+        'Content-Disposition': f'attachment; filename="transactions.{export_format}"',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Export-Rows, X-Next-Cursor',
+        'X-Export-Rows': str(rows_count)
+    }
+    if next_cursor:
+        response_headers['X-Next-Cursor'] = next_cursor
+    
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': base64.b64encode(payload).decode(),
+        'isBase64Encoded': True
+    }
+
+@router.route('GET', 'archives')
+def get_archives(request: Request) -> Dict[str, Any]:
+    cur = request.read_cursor()
+    cur.execute(
+        """SELECT a.partition_name, a.month_start::text AS month_start, a.rows_count,
+                  (SELECT COALESCE(SUM(octet_length(c.data)), 0) FROM transactions_archive_chunks c
+                    WHERE c.partition_name = a.partition_name) AS bytes,
+                  a.archived_at
+             FROM transactions_archive a ORDER BY a.month_start"""
+    )
+    return json_response({'archives': cur.fetchall()})
+
+@router.route('GET', 'archive')
+def get_archive(request: Request) -> Dict[str, Any]:
+    partition_name = request.params.get('partition', '')
+    try:
+        chunk_no = int(request.params.get('chunk', 0))
+    except ValueError:
+        raise HttpError(400, 'chunk must be an integer')
+    
+    cur = request.read_cursor()
+    cur.execute(
+        """SELECT c.rows_count, c.data,
+                  EXISTS (SELECT 1 FROM transactions_archive_chunks n
+                           WHERE n.partition_name = c.partition_name AND n.chunk_no = c.chunk_no + 1) AS has_more
+             FROM transactions_archive_chunks c
+            WHERE c.partition_name = %s AND c.chunk_no = %s""",
+        (partition_name, chunk_no)
+    )
+    chunk = cur.fetchone()
+    if chunk is None:
+        raise HttpError(404, 'Archive not found')
+    
+    # Chunks are separate gzip members; only chunk 0 carries the CSV header, so appending them in order
+    # reproduces the whole month
+    response_headers = {
+        'Content-Type': 'text/csv; charset=utf-8',
+        'Content-Encoding': 'gzip',
+        'Content-Disposition': f'attachment; filename="{partition_name}.{chunk_no}.csv"',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Export-Rows, X-Next-Chunk',
+        'X-Export-Rows': str(chunk['rows_count'])
+    }
+    if chunk['has_more']:
+        response_headers['X-Next-Chunk'] = str(chunk_no + 1)
+    
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': base64.b64encode(bytes(chunk['data'])).decode(),
+        'isBase64Encoded': True
+    }
+
+@router.route('GET', 'top_referrers')
+def get_top_referrers(request: Request) -> Dict[str, Any]:
+    params = request.params
+    order_column = TOP_REFERRERS_ORDER.get(params.get('orderBy', 'downline'))
+    if order_column is None:
+        raise HttpError(400, f"orderBy must be one of {', '.join(TOP_REFERRERS_ORDER)}")
+    limit = parse_limit(params.get('limit'), 20, TOP_REFERRERS_MAX)
+    
+    cur = request.read_cursor()
+    cur.execute(
+        f"""SELECT user_id, direct_count, downline_size, max_depth, rewards
+              FROM referral_totals ORDER BY {order_column} DESC, user_id LIMIT %s""",
+        (limit,)
+    )
+    return json_response({'referrers': cur.fetchall()})
+
+@router.route('GET', 'search')
+def get_search(request: Request) -> Dict[str, Any]:
+    params = request.params
+    query = params.get('q', '').strip()
+    if not query:
+        raise HttpError(400, 'q is required')
+    limit = parse_limit(params.get('limit'), 20, SEARCH_MAX)
+
+    return json_response({'users': search_users(request.read_cursor(), query, limit)})
+
+@router.route('GET', 'referral_tree')
+def get_referral_tree(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('userId')
+    if not user_id:
+        raise HttpError(400, 'userId is required')
+    
+    cur = request.read_cursor()
+    cur.execute("SELECT referral_summary(%s) AS summary", (user_id,))
+    summary = cur.fetchone()['summary']
+    cur.execute(
+        "SELECT ancestor_id AS user_id, depth FROM referral_closure WHERE descendant_id = %s ORDER BY depth",
+        (user_id,)
+    )
+    return json_response({'userId': user_id, **summary, 'upline': cur.fetchall()})
+
+@router.route('GET', 'stats')
+def get_stats(request: Request) -> Dict[str, Any]:
+    return json_response(read_platform_stats(request.read_cursor()))
+
+@router.route('POST', 'add_bonus')
+def post_add_bonus(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    user_id = body_data.get('userId')
+    amount = parse_amount(body_data.get('amount'), 'amount')
+    bonus_type = parse_bonus_type(body_data.get('type'))
+    description = body_data.get('description', 'Бонус от администратора')
+    
+    cur = request.cursor()
+    cur.execute(
+        """INSERT INTO transactions (user_id, type, amount, status, description)
+           SELECT user_id, %s, %s, 'completed', %s FROM users WHERE user_id = %s""",
+        (bonus_type, amount, description, user_id)
+    )
+    if cur.rowcount == 0:
+        raise HttpError(404, 'User not found')
+    request.conn.commit()
+    
+    return json_response({'success': True, 'message': 'Bonus added'})
+
+@router.route('POST', 'recompute_stats')
+def post_recompute_stats(request: Request) -> Dict[str, Any]:
+    cur = request.cursor()
+    previous = read_platform_stats(cur)
+    cur.execute("SELECT recompute_platform_stats()")
+    stats = read_platform_stats(cur)
+    request.conn.commit()
+    
+    drift = {key: stats[key] - previous[key] for key in stats if stats[key] != previous[key]}
+    return json_response({'success': True, 'stats': stats, 'drift': drift})
+
+@router.route('POST', 'maintain_partitions')
+def post_maintain_partitions(request: Request) -> Dict[str, Any]:
+    cur = request.cursor()
+    cur.execute("SELECT ensure_transactions_partitions(%s) AS created", (PARTITIONS_AHEAD,))
+    created = cur.fetchone()['created']
+    request.conn.commit()
+    
+    return json_response({'success': True, 'created': created})
+
+@router.route('POST', 'archive_transactions')
+def post_archive_transactions(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    retain_months = int(body_data.get('retainMonths', RETAIN_MONTHS))
+    limit = int(body_data.get('limit', 1))
+    if retain_months < 1:
+        raise HttpError(400, 'retainMonths must be at least 1')
+    
+    cur = request.cursor()
+    partitions = []
+    blocked = []
+    for partition_name, month_start in archivable_partitions(cur, retain_months):
+        pending = unsettled_withdrawals(cur, partition_name)
+        if pending:
+            blocked.append({'partition': partition_name, 'unsettledWithdrawals': pending})
+        else:
+            partitions.append((partition_name, month_start))
+    
+    if body_data.get('dryRun'):
+        return json_response({
+            'success': True,
+            'dryRun': True,
+            'partitions': [name for name, _ in partitions],
+            'blocked': blocked
+        })
+    request.conn.commit()
+    
+    archived = []
+    for partition_name, month_start in partitions[:limit]:
+        rows = archive_partition(request.conn, partition_name, month_start)
+        if rows is None:
+            blocked.append({'partition': partition_name, 'unsettledWithdrawals': None})
+        else:
+            archived.append({'partition': partition_name, 'rows': rows})
+    
+    return json_response({
+        'success': True,
+        'dryRun': False,
+        'archived': archived,
+        'blocked': blocked,
+        'remaining': len(partitions[limit:])
+    })
+
+@router.route('POST', 'bulk_add_bonus')
+@router.route('POST', 'bulk_update_balance')
+def post_bulk(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    selector = build_user_selector(body_data)
+    if not selector:
+        raise HttpError(400, 'userIds or filter is required')
+    
+    where, args = selector
+    cur = request.cursor()
+    
+    if body_data.get('dryRun'):
+        cur.execute(
+            f"""SELECT COUNT(*) AS count, COALESCE(SUM(b.balance), 0) AS balance
+                  FROM users CROSS JOIN LATERAL account_balance(user_id) AS b WHERE {where}""",
+            args
+        )
+        affected = cur.fetchone()
+        return json_response({
+            'success': True,
+            'dryRun': True,
+            'affectedUsers': affected['count'],
+            'currentBalance': float(affected['balance'])
+        })
+    
+    if body_data['action'] == 'bulk_add_bonus':
+        affected = bulk_add_bonus(
+            cur, where, args,
+            parse_amount(body_data.get('amount'), 'amount'),
+            parse_bonus_type(body_data.get('type')),
+            body_data.get('description', 'Бонус от администратора')
+        )
+    else:
+        affected = bulk_update_balance(cur, where, args, parse_amount(body_data.get('balance'), 'balance', allow_zero=True))
+    request.conn.commit()
+    
+    return json_response({'success': True, 'dryRun': False, 'affectedUsers': affected})
+
+@router.route('POST', 'update_balance')
+def post_update_balance(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('userId')
+    new_balance = parse_amount(request.body.get('balance'), 'balance', allow_zero=True)
+    
+    cur = request.cursor()
+    if not bulk_update_balance(cur, 'user_id = %s', [user_id], new_balance):
+        raise HttpError(404, 'User not found')
+    request.conn.commit()
+    
+    return json_response({'success': True, 'message': 'Balance updated'})
+
+@router.route('GET', 'balance')
+def get_balance(request: Request) -> Dict[str, Any]:
+    params = request.params
+    if not params.get('userId'):
+        raise HttpError(400, 'userId is required')
+    
+    cur = request.read_cursor()
+    cur.execute(
+        "SELECT balance, card_earnings, referral_earnings FROM account_balance(%s, %s::timestamp)",
+        (params['userId'], params.get('asOf'))
+    )
+    balance = cur.fetchone()
+    
+    return json_response({
+        'userId': params['userId'],
+        'asOf': params.get('asOf'),
+        'balance': balance['balance'],
+        'cardEarnings': balance['card_earnings'],
+        'referralEarnings': balance['referral_earnings']
+    })
+
+@router.route('POST', 'snapshot_balances')
+def post_snapshot_balances(request: Request) -> Dict[str, Any]:
+    cur = request.cursor()
+    cur.execute("SELECT take_balance_snapshots() AS accounts")
+    accounts = cur.fetchone()['accounts']
+    request.conn.commit()
+    
+    return json_response({'success': True, 'accounts': accounts})
+
+@router.route('GET', 'metrics')
+def get_metrics(request: Request) -> Dict[str, Any]:
+    return json_response({**router.metrics(), 'caches': {'admin': ADMIN_CACHE.metrics()}})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
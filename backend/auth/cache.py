@@ -0,0 +1,79 @@
+'''
+Business: Кэш статуса администратора в памяти процесса с TTL, LRU-вытеснением и сбросом через LISTEN/NOTIFY
+'''
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+ADMIN_STATUS_CHANNEL = 'admin_status_changed'
+
+
+class TTLCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0, channel: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._listening: 'weakref.WeakSet[Any]' = weakref.WeakSet()
+        self._stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            if entry[0] <= now:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def sync(self, conn) -> None:
+        if not self.channel:
+            return
+        if conn not in self._listening:
+            cur = conn.cursor()
+            cur.execute(f'LISTEN {self.channel}')
+            cur.close()
+            conn.commit()
+            self._listening.add(conn)
+            self.clear()
+            return
+        conn.poll()
+        while conn.notifies:
+            self.invalidate(conn.notifies.pop(0).payload)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,279 @@
+'''
+Business: Пул соединений с PostgreSQL, живущий между тёплыми вызовами функции
+'''
+
+import os
+import threading
+import time
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+from metrics import record_query
+
+NUMERIC_AS_TEXT = extensions.new_type(extensions.DECIMAL.values, 'NUMERIC_AS_TEXT', lambda value, cur: value)
+TIMESTAMP_AS_TEXT = extensions.new_type(extensions.PYDATETIME.values, 'TIMESTAMP_AS_TEXT', lambda value, cur: value)
+
+
+class _QueryTimingMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query((time.perf_counter() - started) * 1000, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query((time.perf_counter() - started) * 1000, self.rowcount)
+
+
+class InstrumentedCursor(_QueryTimingMixin, RealDictCursor):
+    pass
+
+
+class InstrumentedTupleCursor(_QueryTimingMixin, extensions.cursor):
+    pass
+
+
+class InstrumentedConnection(extensions.connection):
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            record_query((time.perf_counter() - started) * 1000)
+
+    def rollback(self):
+        started = time.perf_counter()
+        try:
+            return super().rollback()
+        finally:
+            record_query((time.perf_counter() - started) * 1000)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, name: str, dsn: str, max_size: int = 5, timeout: float = 5.0,
+                 max_lifetime: float = 1800.0, check_idle: float = 30.0):
+        self.name = name
+        self.dsn = dsn
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self._cond = threading.Condition()
+        self._idle: List[Any] = []
+        self._born: Dict[int, float] = {}
+        self._last_used: Dict[int, float] = {}
+        self._size = 0
+        self._stats: Dict[str, float] = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=InstrumentedConnection, cursor_factory=InstrumentedCursor)
+        extensions.register_type(NUMERIC_AS_TEXT, conn)
+        extensions.register_type(TIMESTAMP_AS_TEXT, conn)
+        conn.pool_name = self.name
+        now = time.monotonic()
+        self._born[id(conn)] = now
+        self._last_used[id(conn)] = now
+        self._stats['connects'] += 1
+        return conn
+
+    def _forget(self, conn) -> None:
+        self._born.pop(id(conn), None)
+        self._last_used.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _expired(self, conn, now: float) -> bool:
+        return now - self._born.get(id(conn), now) > self.max_lifetime
+
+    def _healthy(self, conn, now: float) -> bool:
+        if conn.closed or self._expired(conn, now):
+            return False
+        if now - self._last_used.get(id(conn), now) < self.check_idle:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.monotonic()
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No free database connection in pool {self.name!r} after {self.timeout}s')
+                self._cond.wait(remaining)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._size += 1
+
+            waited_ms = (time.monotonic() - started) * 1000
+            self._stats['checkouts'] += 1
+            self._stats['wait_ms_total'] += waited_ms
+            self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], waited_ms)
+            if waited_ms >= 1:
+                self._stats['waits'] += 1
+
+        try:
+            if conn is None:
+                return self._connect()
+            if not self._healthy(conn, time.monotonic()):
+                self._forget(conn)
+                self._stats['reconnects'] += 1
+                return self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        now = time.monotonic()
+        with self._cond:
+            if discard or conn.closed or self._expired(conn, now):
+                self._forget(conn)
+                self._size -= 1
+                self._stats['discarded'] += 1
+            else:
+                self._last_used[id(conn)] = now
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        checkouts = stats['checkouts'] or 1
+        stats['wait_ms_avg'] = round(stats['wait_ms_total'] / checkouts, 3)
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 3)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+        return stats
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str = 'primary', dsn_env: str = 'DATABASE_URL') -> ConnectionPool:
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = ConnectionPool(
+                name,
+                os.environ.get(dsn_env),
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 5)),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+                max_lifetime=float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+                check_idle=float(os.environ.get('DB_POOL_CHECK_IDLE', 30)),
+            )
+            _pools[name] = pool
+        return pool
+
+
+REPLICA_DSN_ENV = 'DATABASE_READ_URL'
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK = float(os.environ.get('DB_REPLICA_LAG_CHECK', 1))
+
+# Zero when the replica has replayed everything it received, or when it is not a standby at all
+REPLICA_LAG_SQL = """
+    SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                         ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)::float8 AS lag
+"""
+
+_replica_lag = {'checked_at': float('-inf'), 'lag': 0.0}
+_routing_stats = {'replica': 0, 'lagging': 0, 'unavailable': 0}
+
+
+def get_db_connection():
+    return get_pool().getconn()
+
+
+def get_read_connection():
+    if not os.environ.get(REPLICA_DSN_ENV):
+        return None
+
+    pool = get_pool('replica', REPLICA_DSN_ENV)
+    try:
+        conn = pool.getconn()
+    except (psycopg2.Error, PoolTimeout):
+        _routing_stats['unavailable'] += 1
+        return None
+
+    now = time.monotonic()
+    if now - _replica_lag['checked_at'] >= REPLICA_LAG_CHECK:
+        try:
+            cur = conn.cursor()
+            cur.execute(REPLICA_LAG_SQL)
+            _replica_lag['lag'] = cur.fetchone()['lag']
+            cur.close()
+            conn.rollback()
+        except psycopg2.Error:
+            pool.putconn(conn, discard=True)
+            _routing_stats['unavailable'] += 1
+            return None
+        _replica_lag['checked_at'] = now
+
+    if _replica_lag['lag'] > REPLICA_MAX_LAG:
+        pool.putconn(conn)
+        _routing_stats['lagging'] += 1
+        return None
+
+    _routing_stats['replica'] += 1
+    return conn
+
+
+def release_db_connection(conn, discard: bool = False) -> None:
+    _pools[getattr(conn, 'pool_name', 'primary')].putconn(conn, discard=discard)
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.metrics() for name, pool in list(_pools.items())}
+
+
+def routing_metrics() -> Dict[str, Any]:
+    return {**_routing_stats, 'replica_lag': round(_replica_lag['lag'], 3), 'max_lag': REPLICA_MAX_LAG}
@@ -5,143 +5,188 @@ Args: event - dict with httpMethod, body, queryStringParameters
 Returns: HTTP response dict with statusCode, headers, body
 '''
 
-import json
 import os
 import hashlib
 import hmac
-from typing import Dict, Any
-from urllib.parse import unquote
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+from typing import Dict, Any, Optional
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+from api import HttpError, Request, Router, json_response, require_admin_session
+from cache import ADMIN_STATUS_CHANNEL, TTLCache
+from ratelimit import Limit, RateLimiter
+from tokens import get_session_token, issue_session_token, verify_session_token
 
-def verify_telegram_auth(auth_data: Dict[str, str]) -> bool:
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    if not bot_token:
-        return False
+UPSERT_TELEGRAM_USER_SQL = """
+    WITH existing AS (
+        SELECT is_admin FROM users WHERE telegram_id = %(telegram_id)s
+    ), upserted AS (
+        INSERT INTO users (user_id, telegram_id, first_name, last_name, username, photo_url, referral_code, is_admin)
+        VALUES (%(user_id)s, %(telegram_id)s, %(first_name)s, %(last_name)s, %(username)s, %(photo_url)s, %(user_id)s, %(is_admin)s)
+        ON CONFLICT (telegram_id) DO UPDATE
+           SET first_name = EXCLUDED.first_name,
+               last_name = EXCLUDED.last_name,
+               username = EXCLUDED.username,
+               photo_url = EXCLUDED.photo_url,
+               is_admin = EXCLUDED.is_admin,
+               updated_at = CURRENT_TIMESTAMP
+         WHERE (users.first_name, users.last_name, users.username, users.photo_url, users.is_admin)
+               IS DISTINCT FROM
+               (EXCLUDED.first_name, EXCLUDED.last_name, EXCLUDED.username, EXCLUDED.photo_url, EXCLUDED.is_admin)
+        RETURNING *
+    )
+    SELECT upserted.*, (SELECT is_admin FROM existing) AS _was_admin FROM upserted
+    UNION ALL
+    SELECT users.*, users.is_admin AS _was_admin FROM users
+     WHERE telegram_id = %(telegram_id)s AND NOT EXISTS (SELECT 1 FROM upserted)
+"""
+
+ADMIN_CACHE = TTLCache(
+    max_size=int(os.environ.get('ADMIN_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('ADMIN_CACHE_TTL', 30)),
+    channel=ADMIN_STATUS_CHANNEL
+)
+
+TELEGRAM_AUTH_MAX_AGE = int(os.environ.get('TELEGRAM_AUTH_MAX_AGE', 86400))
+SEEN_AUTH_HASHES = TTLCache(
+    max_size=int(os.environ.get('TELEGRAM_REPLAY_CACHE_SIZE', 10000)),
+    ttl=TELEGRAM_AUTH_MAX_AGE
+)
+
+RATE_LIMITS = {
+    'POST telegram_login': (None, Limit(0.2, 5)),
+    'POST check_admin': (Limit(1, 10), Limit(5, 30)),
+}
+DEFAULT_RATE_LIMIT = (None, Limit(10, 50))
+
+_telegram_secret_key: Optional[bytes] = None
+
+def get_telegram_secret_key() -> Optional[bytes]:
+    global _telegram_secret_key
+    if _telegram_secret_key is None:
+        bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
+        if not bot_token:
+            return None
+        _telegram_secret_key = hashlib.sha256(bot_token.encode()).digest()
+    return _telegram_secret_key
+
+# Returns the verified hash; the caller marks it as seen only once the login has committed, so a login that
+# fails on the database side can be retried with the same payload
+def verify_telegram_auth(auth_data: Dict[str, str]) -> Optional[str]:
+    secret_key = get_telegram_secret_key()
+    if not secret_key:
+        return None
     
-    check_hash = auth_data.pop('hash', '')
-    data_check_string = '\n'.join([f'{k}={v}' for k, v in sorted(auth_data.items())])
+    check_hash = str(auth_data.pop('hash', ''))
     
-    secret_key = hashlib.sha256(bot_token.encode()).digest()
+    try:
+        auth_date = int(auth_data.get('auth_date', 0))
+    except (TypeError, ValueError):
+        return None
+    if not check_hash or time.time() - auth_date > TELEGRAM_AUTH_MAX_AGE:
+        return None
+    
+    hit, _ = SEEN_AUTH_HASHES.get(check_hash)
+    if hit:
+        return None
+    
+    data_check_string = '\n'.join([f'{k}={v}' for k, v in sorted(auth_data.items())])
     calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
     
-    return calculated_hash == check_hash
+    if not hmac.compare_digest(calculated_hash.encode(), check_hash.encode()):
+        return None
+    return check_hash
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = get_db_connection()
+router = Router(
+    'auth',
+    allow_methods='GET, POST, OPTIONS',
+    allow_headers='Content-Type, X-Session-Token, X-Last-Write',
+    limiter=RateLimiter(RATE_LIMITS, DEFAULT_RATE_LIMIT)
+)
+
+@router.route('POST', 'telegram_login')
+def post_telegram_login(request: Request) -> Dict[str, Any]:
+    auth_data = request.body.get('authData', {})
+    
+    check_hash = verify_telegram_auth(auth_data)
+    if not check_hash:
+        raise HttpError(401, 'Invalid authentication')
+    
+    telegram_id = int(auth_data.get('id'))
+    admin_telegram_id = os.environ.get('ADMIN_TELEGRAM_ID')
+    is_admin = str(telegram_id) == admin_telegram_id
+    
+    conn = request.conn
     cur = conn.cursor()
+    upsert_args = {
+        'user_id': f'TG{telegram_id}',
+        'telegram_id': telegram_id,
+        'first_name': auth_data.get('first_name', ''),
+        'last_name': auth_data.get('last_name', ''),
+        'username': auth_data.get('username', ''),
+        'photo_url': auth_data.get('photo_url', ''),
+        'is_admin': is_admin
+    }
+    cur.execute(UPSERT_TELEGRAM_USER_SQL, upsert_args)
+    row = cur.fetchone()
+    if row is None:
+        # A concurrent first login inserted the user after this statement's snapshot; a new statement sees it
+        cur.execute(UPSERT_TELEGRAM_USER_SQL, upsert_args)
+        row = cur.fetchone()
+    user = dict(row)
+    was_admin = bool(user.pop('_was_admin'))
     
-    try:
-        if method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            action = body_data.get('action')
-            
-            if action == 'telegram_login':
-                auth_data = body_data.get('authData', {})
-                
-                if not verify_telegram_auth(auth_data):
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Invalid authentication'}),
-                        'isBase64Encoded': False
-                    }
-                
-                telegram_id = int(auth_data.get('id'))
-                first_name = auth_data.get('first_name', '')
-                last_name = auth_data.get('last_name', '')
-                username = auth_data.get('username', '')
-                photo_url = auth_data.get('photo_url', '')
-                
-                admin_telegram_id = os.environ.get('ADMIN_TELEGRAM_ID')
-                is_admin = str(telegram_id) == admin_telegram_id
-                
-                cur.execute(
-                    "SELECT * FROM users WHERE telegram_id = %s",
-                    (telegram_id,)
-                )
-                user = cur.fetchone()
-                
-                if user:
-                    cur.execute(
-                        "UPDATE users SET first_name = %s, last_name = %s, username = %s, photo_url = %s, is_admin = %s, updated_at = CURRENT_TIMESTAMP WHERE telegram_id = %s RETURNING *",
-                        (first_name, last_name, username, photo_url, is_admin, telegram_id)
-                    )
-                    user = cur.fetchone()
-                else:
-                    user_id = f'TG{telegram_id}'
-                    referral_code = user_id
-                    
-                    cur.execute(
-                        "INSERT INTO users (user_id, telegram_id, first_name, last_name, username, photo_url, referral_code, is_admin) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING *",
-                        (user_id, telegram_id, first_name, last_name, username, photo_url, referral_code, is_admin)
-                    )
-                    user = cur.fetchone()
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'success': True,
-                        'user': dict(user)
-                    }, default=str),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'check_admin':
-                user_id = body_data.get('userId')
-                
-                cur.execute(
-                    "SELECT is_admin FROM users WHERE user_id = %s",
-                    (user_id,)
-                )
-                user = cur.fetchone()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'isAdmin': user['is_admin'] if user else False
-                    }),
-                    'isBase64Encoded': False
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
+    admin_changed = was_admin != is_admin
+    if admin_changed:
+        cur.execute("SELECT pg_notify(%s, %s)", (ADMIN_STATUS_CHANNEL, user['user_id']))
+    cur.close()
+    
+    conn.commit()
+    SEEN_AUTH_HASHES.set(check_hash, True)
+    if admin_changed:
+        ADMIN_CACHE.invalidate(user['user_id'])
+    
+    session = issue_session_token(user['user_id'], is_admin)
+    
+    return json_response({
+        'success': True,
+        'user': user,
+        'token': session['token'] if session else None,
+        'expiresAt': session['expiresAt'] if session else None
+    })
+
+@router.route('POST', 'check_admin')
+def post_check_admin(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('userId')
+    token = get_session_token(request.event)
+    session = verify_session_token(token) if token else None
+    
+    if session and session['sub'] == user_id:
+        return json_response({'isAdmin': session['adm']})
+    
+    conn = request.conn
+    ADMIN_CACHE.sync(conn)
+    hit, is_admin = ADMIN_CACHE.get(user_id)
+    
+    if not hit:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT is_admin FROM users WHERE user_id = %s",
+            (user_id,)
+        )
+        user = cur.fetchone()
         cur.close()
-        conn.close()
+        is_admin = bool(user['is_admin']) if user else False
+        ADMIN_CACHE.set(user_id, is_admin)
+    
+    return json_response({'isAdmin': is_admin})
+
+@router.route('GET', 'metrics')
+def get_metrics(request: Request) -> Dict[str, Any]:
+    require_admin_session(request)
+    return json_response({
+        **router.metrics(),
+        'caches': {'admin': ADMIN_CACHE.metrics(), 'telegram_replay': SEEN_AUTH_HASHES.metrics()}
+    })
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
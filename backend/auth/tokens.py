@@ -0,0 +1,71 @@
+'''
+Business: Подписанные HMAC токены сессии для проверки пользователя без запроса к базе
+'''
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Dict, Any, Optional
+
+SESSION_TOKEN_HEADER = 'X-Session-Token'
+
+_secret_key: Optional[bytes] = None
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _get_secret_key() -> Optional[bytes]:
+    global _secret_key
+    if _secret_key is None:
+        secret = os.environ.get('SESSION_SECRET')
+        if not secret:
+            return None
+        _secret_key = hashlib.sha256(b'session-token:' + secret.encode()).digest()
+    return _secret_key
+
+
+def issue_session_token(user_id: str, is_admin: bool, ttl: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    secret_key = _get_secret_key()
+    if secret_key is None:
+        return None
+
+    expires_at = int(time.time()) + (ttl or int(os.environ.get('SESSION_TTL', 43200)))
+    payload = _b64encode(json.dumps(
+        {'sub': user_id, 'adm': bool(is_admin), 'exp': expires_at},
+        separators=(',', ':')
+    ).encode())
+    signature = _b64encode(hmac.new(secret_key, payload.encode(), hashlib.sha256).digest())
+    return {'token': f'{payload}.{signature}', 'expiresAt': expires_at}
+
+
+def verify_session_token(token: str) -> Optional[Dict[str, Any]]:
+    secret_key = _get_secret_key()
+    if secret_key is None or token.count('.') != 1:
+        return None
+
+    payload, signature = token.split('.')
+    expected = _b64encode(hmac.new(secret_key, payload.encode(), hashlib.sha256).digest())
+    if not hmac.compare_digest(expected.encode(), signature.encode()):
+        return None
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or not isinstance(claims.get('exp'), int) or claims['exp'] <= time.time():
+        return None
+    return claims
+
+
+def get_session_token(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers', {}) or {}
+    return headers.get(SESSION_TOKEN_HEADER.lower()) or headers.get(SESSION_TOKEN_HEADER)
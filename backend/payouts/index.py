@@ -0,0 +1,149 @@
+'''
+Business: Обработчик очереди выводов: забирает ожидающие выплаты пачками и отправляет их провайдеру
+Args: event - dict with httpMethod, body, queryStringParameters (timer trigger invocations have no httpMethod)
+      context - object with request_id, function_name attributes
+Returns: HTTP response dict with statusCode, headers, body
+'''
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from psycopg2.extras import execute_values
+
+from api import HttpError, Request, Router, json_response, require_admin_session
+from payouts import PayoutBackend, get_payout_backend
+
+BATCH_SIZE = int(os.environ.get('PAYOUT_BATCH_SIZE', 50))
+CONCURRENCY = int(os.environ.get('PAYOUT_CONCURRENCY', 8))
+TIME_BUDGET = float(os.environ.get('PAYOUT_TIME_BUDGET', 20))
+LEASE_SECONDS = int(os.environ.get('PAYOUT_LEASE', 300))
+MAX_ATTEMPTS = int(os.environ.get('PAYOUT_MAX_ATTEMPTS', 5))
+RETRY_BASE_SECONDS = int(os.environ.get('PAYOUT_RETRY_BASE', 30))
+RETRY_MAX_SECONDS = int(os.environ.get('PAYOUT_RETRY_MAX', 3600))
+
+_executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+
+def claim_batch(conn, batch_size: int) -> List[Dict[str, Any]]:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """WITH claimed AS (
+                   SELECT id, created_at FROM transactions
+                    WHERE type = 'withdraw'
+                      AND ((status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= CURRENT_TIMESTAMP))
+                           OR (status = 'processing' AND claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)))
+                    ORDER BY created_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+               )
+               UPDATE transactions AS t
+                  SET status = 'processing', claimed_at = CURRENT_TIMESTAMP, attempts = t.attempts + 1
+                 FROM claimed
+                WHERE t.id = claimed.id AND t.created_at = claimed.created_at
+               RETURNING t.id, t.created_at, t.user_id, t.amount, t.phone, t.bank, t.attempts""",
+            (LEASE_SECONDS, batch_size)
+        )
+        batch = cur.fetchall()
+        conn.commit()
+        return batch
+    finally:
+        cur.close()
+
+def send_payout(backend: PayoutBackend, payout: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return backend.send(payout)
+    except Exception as e:
+        return {'status': 'retry', 'reference': None, 'error': f'{type(e).__name__}: {e}'}
+
+def mark_results(conn, batch: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> None:
+    cur = conn.cursor()
+    try:
+        execute_values(
+            cur,
+            f"""UPDATE transactions AS t
+                  SET status = CASE WHEN v.status <> 'retry' THEN v.status
+                                    WHEN t.attempts >= {MAX_ATTEMPTS} THEN 'failed'
+                                    ELSE 'pending' END,
+                      next_attempt_at = CASE WHEN v.status = 'retry'
+                                             THEN CURRENT_TIMESTAMP + make_interval(
+                                                      secs => LEAST({RETRY_MAX_SECONDS}, {RETRY_BASE_SECONDS} * 2 ^ (t.attempts - 1)))
+                                        END,
+                      payout_ref = v.reference,
+                      failure_reason = v.error,
+                      claimed_at = NULL
+                 FROM (VALUES %s) AS v(id, created_at, status, reference, error)
+                WHERE t.id = v.id AND t.created_at = v.created_at AND t.status = 'processing'""",
+            [(payout['id'], payout['created_at'], result['status'], result.get('reference'), result.get('error'))
+             for payout, result in zip(batch, results)],
+            template='(%s, %s::timestamp, %s, %s, %s)',
+            page_size=len(batch)
+        )
+        conn.commit()
+    finally:
+        cur.close()
+
+def drain_queue(conn, backend: PayoutBackend, batch_size: int = BATCH_SIZE,
+                time_budget: float = TIME_BUDGET, max_batches: Optional[int] = None) -> Dict[str, Any]:
+    deadline = time.monotonic() + time_budget
+    totals = {'batches': 0, 'claimed': 0, 'completed': 0, 'failed': 0, 'retry': 0}
+
+    while time.monotonic() < deadline and (max_batches is None or totals['batches'] < max_batches):
+        batch = claim_batch(conn, batch_size)
+        if not batch:
+            break
+
+        results = list(_executor.map(lambda payout: send_payout(backend, payout), batch))
+        mark_results(conn, batch, results)
+
+        totals['batches'] += 1
+        totals['claimed'] += len(batch)
+        for result in results:
+            totals[result['status']] = totals.get(result['status'], 0) + 1
+
+    return totals
+
+def require_trigger_or_admin(request: Request) -> Optional[Dict[str, Any]]:
+    if 'httpMethod' not in request.event:
+        return None
+    require_admin_session(request)
+    return None
+
+router = Router(
+    'payouts',
+    allow_methods='GET, POST, OPTIONS',
+    allow_headers='Content-Type, X-Session-Token, X-Last-Write',
+    guard=require_trigger_or_admin
+)
+
+@router.route('GET')
+@router.route('POST', 'drain')
+def post_drain(request: Request) -> Dict[str, Any]:
+    try:
+        backend = get_payout_backend()
+    except (KeyError, ValueError) as e:
+        raise HttpError(500, f'Payout backend is not configured: {e}')
+
+    max_batches = request.body.get('maxBatches') if request.method == 'POST' else None
+    totals = drain_queue(request.conn, backend, max_batches=int(max_batches) if max_batches else None)
+    return json_response({'success': True, 'backend': backend.name, **totals})
+
+@router.route('GET', 'queue')
+def get_queue(request: Request) -> Dict[str, Any]:
+    cur = request.read_cursor()
+    cur.execute(
+        """SELECT status, COUNT(*) AS count, COALESCE(SUM(amount), 0) AS amount,
+                  MIN(created_at) AS oldest
+             FROM transactions
+            WHERE type = 'withdraw' AND status IN ('pending', 'processing')
+            GROUP BY status"""
+    )
+    return json_response({'queue': {row['status']: row for row in cur.fetchall()}})
+
+@router.route('GET', 'metrics')
+def get_metrics(request: Request) -> Dict[str, Any]:
+    return json_response(router.metrics())
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
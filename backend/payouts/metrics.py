@@ -0,0 +1,104 @@
+'''
+Business: Замеры времени действий и запросов к базе с логированием и скользящими перцентилями
+'''
+
+import json
+import math
+import os
+import sys
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+LOG_REQUESTS = os.environ.get('METRICS_LOG', '1') != '0'
+WINDOW_SIZE = int(os.environ.get('METRICS_WINDOW', 1000))
+
+_local = threading.local()
+
+
+class QueryStats:
+    __slots__ = ('queries', 'rows', 'db_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.db_ms = 0.0
+
+
+def start_request() -> QueryStats:
+    stats = QueryStats()
+    _local.stats = stats
+    return stats
+
+
+def finish_request() -> None:
+    _local.stats = None
+
+
+def record_query(elapsed_ms: float, rows: int = 0) -> None:
+    stats: Optional[QueryStats] = getattr(_local, 'stats', None)
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_ms += elapsed_ms
+    if rows > 0:
+        stats.rows += rows
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return round(sorted_values[index], 3)
+
+
+class ActionStats:
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.window = window
+        self._lock = threading.Lock()
+        self._actions: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, key: str, status: int, wall_ms: float, query_stats: QueryStats) -> None:
+        with self._lock:
+            entry = self._actions.get(key)
+            if entry is None:
+                entry = self._actions[key] = {
+                    'count': 0,
+                    'errors': 0,
+                    'queries': 0,
+                    'rows': 0,
+                    'wall_ms': deque(maxlen=self.window),
+                    'db_ms': deque(maxlen=self.window),
+                }
+            entry['count'] += 1
+            if status >= 500:
+                entry['errors'] += 1
+            entry['queries'] += query_stats.queries
+            entry['rows'] += query_stats.rows
+            entry['wall_ms'].append(wall_ms)
+            entry['db_ms'].append(query_stats.db_ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            entries = {key: (dict(entry), sorted(entry['wall_ms']), sorted(entry['db_ms']))
+                       for key, entry in self._actions.items()}
+
+        result: Dict[str, Dict[str, Any]] = {}
+        for key, (entry, wall, db) in entries.items():
+            result[key] = {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'avg_queries': round(entry['queries'] / entry['count'], 2),
+                'avg_rows': round(entry['rows'] / entry['count'], 2),
+                'wall_ms': {'p50': percentile(wall, 50), 'p95': percentile(wall, 95),
+                            'p99': percentile(wall, 99), 'max': percentile(wall, 100)},
+                'db_ms': {'p50': percentile(db, 50), 'p95': percentile(db, 95),
+                          'p99': percentile(db, 99), 'max': percentile(db, 100)},
+            }
+        return result
+
+
+def log_request(record: Dict[str, Any]) -> None:
+    if LOG_REQUESTS:
+        sys.stdout.write(json.dumps(record, separators=(',', ':'), default=str) + '\n')
+        sys.stdout.flush()
@@ -0,0 +1,93 @@
+'''
+Business: Подключаемые провайдеры выплат для обработчика очереди выводов
+'''
+
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Any, Type
+
+# send() returns {'status': 'completed' | 'failed' | 'retry', 'reference', 'error'}. Backends must treat
+# the transaction id as an idempotency key: a claim whose lease expired can be sent a second time.
+
+
+class PayoutBackend:
+    name = 'base'
+
+    def send(self, payout: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class StubPayoutBackend(PayoutBackend):
+    name = 'stub'
+
+    def __init__(self):
+        self.latency = float(os.environ.get('PAYOUT_STUB_LATENCY', 0))
+        self.failure_rate = float(os.environ.get('PAYOUT_STUB_FAILURE_RATE', 0))
+
+    def send(self, payout: Dict[str, Any]) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            return {'status': 'failed', 'reference': None, 'error': 'Rejected by stub backend'}
+        return {'status': 'completed', 'reference': f"stub-{payout['id']}", 'error': None}
+
+
+class HttpPayoutBackend(PayoutBackend):
+    name = 'http'
+
+    def __init__(self):
+        self.url = os.environ['PAYOUT_API_URL']
+        self.token = os.environ.get('PAYOUT_API_TOKEN')
+        self.timeout = float(os.environ.get('PAYOUT_API_TIMEOUT', 10))
+
+    def send(self, payout: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': f"withdraw-{payout['id']}"}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({
+                'id': payout['id'],
+                'amount': str(payout['amount']),
+                'phone': payout['phone'],
+                'bank': payout['bank']
+            }).encode(),
+            headers=headers,
+            method='POST'
+        )
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code not in (408, 429):
+                return {'status': 'failed', 'reference': None, 'error': f'Payout API rejected the payout: HTTP {e.code}'}
+            return {'status': 'retry', 'reference': None, 'error': f'Payout API error: HTTP {e.code}'}
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            return {'status': 'retry', 'reference': None, 'error': f'Payout API unavailable: {e}'}
+
+        return {'status': 'completed', 'reference': str(body.get('id') or body.get('reference') or ''), 'error': None}
+
+
+PAYOUT_BACKENDS: Dict[str, Type[PayoutBackend]] = {
+    StubPayoutBackend.name: StubPayoutBackend,
+    HttpPayoutBackend.name: HttpPayoutBackend,
+}
+
+_backend: Dict[str, PayoutBackend] = {}
+
+
+# The stub completes payouts without moving money, so it must be selected explicitly with PAYOUT_BACKEND=stub
+def get_payout_backend() -> PayoutBackend:
+    name = os.environ.get('PAYOUT_BACKEND')
+    if not name:
+        raise ValueError('PAYOUT_BACKEND is not set')
+    if name not in _backend:
+        if name not in PAYOUT_BACKENDS:
+            raise ValueError(f'Unknown payout backend {name!r}')
+        _backend[name] = PAYOUT_BACKENDS[name]()
+    return _backend[name]
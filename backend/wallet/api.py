@@ -0,0 +1,261 @@
+'''
+Business: Диспетчер действий и сборка HTTP-ответов для облачных функций
+'''
+
+import json
+import time
+import traceback
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from db import (REPLICA_MAX_LAG, get_db_connection, get_read_connection, pool_metrics, release_db_connection,
+                routing_metrics)
+from metrics import ActionStats, finish_request, log_request, start_request
+from tokens import get_session_token, verify_session_token
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (Decimal, datetime, date)):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'), default=_encode_value)
+
+
+def encode_json(payload: Any) -> str:
+    return _encoder.encode(payload)
+
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {**JSON_HEADERS, **headers} if headers else JSON_HEADERS,
+        'body': encode_json(payload),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(status: int, message: str) -> Dict[str, Any]:
+    return json_response({'error': message}, status)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, event: Dict[str, Any], context: Any):
+        self.event = event
+        self.context = context
+        self.method: str = event.get('httpMethod', 'GET')
+        self.params: Dict[str, Any] = event.get('queryStringParameters') or {}
+        self.headers: Dict[str, str] = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        self._body: Optional[Dict[str, Any]] = None
+        self._conn = None
+        self._read_conn = None
+        self._cursors: List[Any] = []
+        self.route: str = self.method
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        if self._body is None:
+            try:
+                body = json.loads(self.event.get('body') or '{}')
+            except ValueError:
+                raise HttpError(400, 'Invalid JSON body')
+            self._body = body if isinstance(body, dict) else {}
+        return self._body
+
+    @property
+    def action(self) -> Optional[str]:
+        if self.method == 'GET':
+            return self.params.get('action')
+        return self.body.get('action')
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = get_db_connection()
+        return self._conn
+
+    @property
+    def recently_wrote(self) -> bool:
+        try:
+            last_write = float(self.headers.get(LAST_WRITE_HEADER.lower(), 0))
+        except ValueError:
+            return False
+        return time.time() - last_write < REPLICA_MAX_LAG
+
+    @property
+    def read_conn(self):
+        if self._read_conn is None:
+            if self.recently_wrote:
+                return self.conn
+            self._read_conn = get_read_connection()
+            if self._read_conn is None:
+                return self.conn
+        return self._read_conn
+
+    @property
+    def on_replica(self) -> bool:
+        return self._read_conn is not None
+
+    def cursor(self):
+        cur = self.conn.cursor()
+        self._cursors.append(cur)
+        return cur
+
+    def read_cursor(self):
+        cur = self.read_conn.cursor()
+        self._cursors.append(cur)
+        return cur
+
+    def release(self, failed: bool = False) -> None:
+        for cur in self._cursors:
+            cur.close()
+        self._cursors.clear()
+        if self._read_conn is not None:
+            release_db_connection(self._read_conn)
+            self._read_conn = None
+        if self._conn is None:
+            return
+        if failed:
+            try:
+                self._conn.rollback()
+            except Exception:
+                release_db_connection(self._conn, discard=True)
+                self._conn = None
+                return
+        release_db_connection(self._conn)
+        self._conn = None
+
+
+ActionHandler = Callable[[Request], Dict[str, Any]]
+
+
+class Router:
+    def __init__(self, name: str, allow_methods: str, allow_headers: str,
+                 guard: Optional[Callable[[Request], Optional[Dict[str, Any]]]] = None, limiter: Any = None):
+        self.name = name
+        self.guard = guard
+        self.limiter = limiter
+        self.routes: Dict[Tuple[str, Optional[str]], ActionHandler] = {}
+        self.stats = ActionStats()
+        self.options_response = {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': allow_methods,
+                'Access-Control-Allow-Headers': allow_headers,
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    def route(self, method: str, action: Optional[str] = None) -> Callable[[ActionHandler], ActionHandler]:
+        def register(fn: ActionHandler) -> ActionHandler:
+            self.routes[(method, action)] = fn
+            return fn
+        return register
+
+    def _handle(self, request: Request) -> Dict[str, Any]:
+        action = request.action
+        fn = self.routes.get((request.method, action))
+        if fn is not None:
+            request.route = f'{request.method} {action}' if action else request.method
+
+        # The limiter runs before the guard and the handler so that throttled calls never open a connection
+        if self.limiter:
+            limited = self.limiter.check(request)
+            if limited is not None:
+                return limited
+
+        if self.guard:
+            denied = self.guard(request)
+            if denied is not None:
+                return denied
+
+        if fn is None:
+            return error_response(405, 'Method not allowed')
+        return fn(request)
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        if event.get('httpMethod') == 'OPTIONS':
+            return self.options_response
+
+        started = time.perf_counter()
+        query_stats = start_request()
+        request = Request(event, context)
+        error: Optional[Exception] = None
+
+        try:
+            response = self._handle(request)
+        except HttpError as e:
+            response = error_response(e.status, e.message)
+        except Exception as e:
+            error = e
+            # The exception text can carry SQL and constraint names; it is logged with the request record instead
+            response = json_response(
+                {'error': 'Internal server error', 'requestId': getattr(context, 'request_id', None)}, 500
+            )
+
+        if request.method != 'GET' and request._conn is not None and response['statusCode'] < 400:
+            response['headers'] = {
+                **response['headers'],
+                LAST_WRITE_HEADER: f'{time.time():.3f}',
+                'Access-Control-Expose-Headers': LAST_WRITE_HEADER
+            }
+
+        try:
+            request.release(failed=response['statusCode'] >= 400)
+        finally:
+            finish_request()
+            wall_ms = (time.perf_counter() - started) * 1000
+            status = response['statusCode']
+            self.stats.record(request.route, status, wall_ms, query_stats)
+
+            record: Dict[str, Any] = {
+                'function': self.name,
+                'action': request.route,
+                'status': status,
+                'wall_ms': round(wall_ms, 3),
+                'db_ms': round(query_stats.db_ms, 3),
+                'queries': query_stats.queries,
+                'rows': query_stats.rows,
+                'request_id': getattr(request.context, 'request_id', None)
+            }
+            if error is not None:
+                record['error_type'] = type(error).__name__
+                record['error'] = str(error)
+                record['traceback'] = traceback.format_exception(type(error), error, error.__traceback__)
+            log_request(record)
+
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        result = {
+            'function': self.name,
+            'actions': self.stats.snapshot(),
+            'pools': pool_metrics(),
+            'routing': routing_metrics()
+        }
+        if self.limiter:
+            result['rateLimits'] = self.limiter.snapshot()
+        return result
+
+
+def require_admin_session(request: Request) -> Dict[str, Any]:
+    token = get_session_token(request.event)
+    session = verify_session_token(token) if token else None
+    if not session or not session.get('adm'):
+        raise HttpError(403, 'Access denied')
+    return session
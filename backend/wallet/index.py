@@ -5,222 +5,438 @@ Args: event - dict with httpMethod, body, queryStringParameters
 Returns: HTTP response dict with statusCode, headers, body
 '''
 
-import json
+import hashlib
+import hmac
+import math
 import os
-from typing import Dict, Any, Optional
-from datetime import datetime
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, List, Optional, Tuple
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+from psycopg2.extras import execute_values
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = get_db_connection()
+from api import HttpError, Request, Router, encode_json, json_response, require_admin_session
+from ratelimit import Limit, RateLimiter
+from tokens import get_session_token, verify_session_token
+
+CARD_BONUS = 500.00
+REFERRAL_BONUS = 200.00
+MAX_AMOUNT = 99999999.99
+BATCH_MAX_OPERATIONS = 10000
+BATCH_PAGE_SIZE = 1000
+BATCH_OPERATIONS = {
+    'topup': ('topup', 'Пополнение через СБП'),
+    'cardBonus': ('card_bonus', 'Бонус за оформление карты'),
+    'referralBonus': ('referral_bonus', 'Реферальный бонус'),
+}
+
+RATE_LIMITS = {
+    'GET': (Limit(2, 20), Limit(20, 100)),
+    'POST withdraw': (Limit(0.1, 3), Limit(1, 10)),
+    'POST topup': (Limit(0.5, 5), Limit(2, 20)),
+    'POST cardBonus': (Limit(0.1, 2), Limit(1, 10)),
+    'POST referralBonus': (Limit(0.2, 5), Limit(1, 10)),
+    'POST batch': (None, Limit(0.5, 5)),
+}
+DEFAULT_RATE_LIMIT = (Limit(2, 20), Limit(10, 50))
+
+ETAG_HEADERS = {'Cache-Control': 'private, no-cache', 'Access-Control-Expose-Headers': 'ETag'}
+
+WALLET_USER_UPSERT_SQL = """
+    WITH inserted AS (
+        INSERT INTO users (user_id, referral_code) VALUES (%(user_id)s, %(user_id)s)
+        ON CONFLICT (user_id) DO NOTHING
+        RETURNING *
+    ), wallet_user AS (
+        SELECT * FROM inserted
+        UNION ALL
+        SELECT * FROM users WHERE user_id = %(user_id)s
+    )
+"""
+
+WALLET_USER_SELECT_SQL = """
+    WITH wallet_user AS (
+        SELECT * FROM users WHERE user_id = %(user_id)s
+    )
+"""
+
+WALLET_SUMMARY_SQL = """{wallet_user}
+    SELECT wallet_user.*,
+           balance.balance,
+           balance.card_earnings,
+           balance.referral_earnings,
+           {transactions} AS _transactions,
+           COALESCE((SELECT direct_count FROM referral_totals
+                      WHERE user_id = %(user_id)s), 0) AS _referral_count,
+           {version} AS _version
+    FROM wallet_user
+    CROSS JOIN LATERAL account_balance(wallet_user.user_id) AS balance
+    LIMIT 1
+"""
+
+RECENT_TRANSACTIONS_SQL = """
+    (SELECT COALESCE(json_agg(
+                to_jsonb(t) || jsonb_build_object('amount', t.amount::text, 'created_at', t.created_at::text)
+                ORDER BY t.created_at DESC
+            ), '[]'::json)
+       FROM (SELECT * FROM transactions WHERE user_id = %(user_id)s
+              ORDER BY created_at DESC LIMIT 10) t)
+"""
+
+# Every change visible in the summary moves one of these: the user row, the highest transaction id, the latest
+# status change of a transaction, or the direct referral count. Each part is an index probe. Ids are drawn at
+# insert time, so unlike created_at (the transaction start) they follow the order rows become visible.
+WALLET_VERSION_SQL = """
+    concat_ws(':', wallet_user.updated_at,
+        (SELECT max(id) FROM transactions WHERE user_id = %(user_id)s),
+        (SELECT max(updated_at) FROM transactions WHERE user_id = %(user_id)s AND updated_at IS NOT NULL),
+        (SELECT direct_count FROM referral_totals WHERE user_id = %(user_id)s))
+"""
+
+WALLET_ETAG_SQL = WALLET_USER_SELECT_SQL + f"""
+    SELECT wallet_user.id, {WALLET_VERSION_SQL} AS version FROM wallet_user
+"""
+
+def fetch_wallet_summary(conn, user_id: str, include_transactions: bool = True,
+                         create: bool = True) -> Optional[Dict[str, Any]]:
+    sql = WALLET_SUMMARY_SQL.format(
+        wallet_user=WALLET_USER_UPSERT_SQL if create else WALLET_USER_SELECT_SQL,
+        transactions=RECENT_TRANSACTIONS_SQL if include_transactions else 'NULL',
+        version=WALLET_VERSION_SQL
+    )
+    autocommit = conn.autocommit
+    conn.autocommit = True
     cur = conn.cursor()
+    try:
+        cur.execute(sql, {'user_id': user_id})
+        row = cur.fetchone()
+        if row is None and create:
+            cur.execute(sql, {'user_id': user_id})
+            row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.autocommit = autocommit
     
+    if row is None:
+        return None
+    user = dict(row)
+    transactions = user.pop('_transactions')
+    summary: Dict[str, Any] = {'user': user}
+    if include_transactions:
+        summary['transactions'] = transactions
+    summary['referralCount'] = user.pop('_referral_count')
+    summary['version'] = user.pop('_version')
+    return summary
+
+def wallet_etag(user_row_id: int, version: str, include_transactions: bool) -> str:
+    digest = hashlib.sha1(version.encode()).hexdigest()[:16]
+    suffix = '' if include_transactions else '-s'
+    return f'W/"{user_row_id}-{digest}{suffix}"'
+
+def fetch_wallet_etag(conn, user_id: str, include_transactions: bool) -> Optional[str]:
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    cur = conn.cursor()
     try:
-        if method == 'GET':
-            params = event.get('queryStringParameters', {}) or {}
-            user_id = params.get('userId')
-            
-            if not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'userId is required'}),
-                    'isBase64Encoded': False
-                }
-            
-            cur.execute(
-                "SELECT * FROM users WHERE user_id = %s",
-                (user_id,)
+        cur.execute(WALLET_ETAG_SQL, {'user_id': user_id})
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.autocommit = autocommit
+    return wallet_etag(row['id'], row['version'], include_transactions) if row else None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    return any(tag.strip() in ('*', etag, etag[2:]) for tag in if_none_match.split(','))
+
+def parse_amount(value: Any) -> Optional[float]:
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(amount) or amount <= 0 or amount > MAX_AMOUNT:
+        return None
+    return amount
+
+def apply_batch(conn, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = [{'index': i, 'success': False} for i in range(len(operations))]
+    valid = []
+    
+    for i, op in enumerate(operations):
+        if not isinstance(op, dict):
+            results[i]['error'] = 'Invalid operation'
+            continue
+        
+        action = op.get('action')
+        user_id = op.get('userId')
+        referred_id = op.get('referredId')
+        
+        if action not in BATCH_OPERATIONS:
+            results[i]['error'] = 'Unsupported action'
+            continue
+        if not user_id:
+            results[i]['error'] = 'userId is required'
+            continue
+        
+        if action == 'topup':
+            amount = parse_amount(op.get('amount'))
+            if amount is None:
+                results[i]['error'] = f'amount must be a positive number up to {MAX_AMOUNT}'
+                continue
+        elif action == 'cardBonus':
+            amount = CARD_BONUS
+        else:
+            amount = REFERRAL_BONUS
+            if not referred_id:
+                results[i]['error'] = 'referredId is required'
+                continue
+        
+        valid.append((i, action, str(user_id), amount, referred_id))
+    
+    if not valid:
+        return results
+    
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT user_id FROM users WHERE user_id = ANY(%s)",
+            (list({user_id for _, _, user_id, _, _ in valid}),)
+        )
+        found = {row['user_id'] for row in cur.fetchall()}
+        applied = [op for op in valid if op[2] in found]
+        
+        if applied:
+            execute_values(
+                cur,
+                "INSERT INTO transactions (user_id, type, amount, status, description) VALUES %s",
+                [(user_id, BATCH_OPERATIONS[action][0], amount, 'completed', BATCH_OPERATIONS[action][1])
+                 for _, action, user_id, amount, _ in applied],
+                page_size=BATCH_PAGE_SIZE
             )
-            user = cur.fetchone()
             
-            if not user:
-                referral_code = user_id
-                cur.execute(
-                    "INSERT INTO users (user_id, referral_code) VALUES (%s, %s) RETURNING *",
-                    (user_id, referral_code)
+            referrals = [(user_id, referred_id, 'completed')
+                         for _, action, user_id, _, referred_id in applied if action == 'referralBonus']
+            if referrals:
+                execute_values(
+                    cur,
+                    "INSERT INTO referrals (referrer_id, referred_id, status) VALUES %s",
+                    referrals,
+                    page_size=BATCH_PAGE_SIZE
                 )
-                user = cur.fetchone()
-                conn.commit()
-            
-            cur.execute(
-                "SELECT * FROM transactions WHERE user_id = %s ORDER BY created_at DESC LIMIT 10",
-                (user_id,)
-            )
-            transactions = cur.fetchall()
-            
+        
+        conn.commit()
+    finally:
+        cur.close()
+    
+    for i, _, user_id, amount, _ in valid:
+        if user_id in found:
+            results[i].update(success=True, amount=amount)
+        else:
+            results[i]['error'] = 'User not found'
+    
+    return results
+
+def withdraw(conn, user_id: str, amount: float, phone: Optional[str], bank: Optional[str],
+             idempotency_key: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+    cur = conn.cursor()
+    try:
+        if idempotency_key:
             cur.execute(
-                "SELECT COUNT(*) as count FROM referrals WHERE referrer_id = %s AND status = 'completed'",
-                (user_id,)
+                """INSERT INTO idempotency_keys (user_id, idempotency_key, action) VALUES (%s, %s, 'withdraw')
+                   ON CONFLICT DO NOTHING RETURNING user_id""",
+                (user_id, idempotency_key)
             )
-            referral_count = cur.fetchone()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'user': dict(user),
-                    'transactions': [dict(t) for t in transactions],
-                    'referralCount': referral_count['count']
-                }, default=str),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            action = body_data.get('action')
-            user_id = body_data.get('userId')
-            
-            if not user_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'userId is required'}),
-                    'isBase64Encoded': False
-                }
-            
-            if action == 'withdraw':
-                amount = float(body_data.get('amount', 0))
-                phone = body_data.get('phone')
-                bank = body_data.get('bank')
-                
-                cur.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
-                user = cur.fetchone()
-                
-                if not user or user['balance'] < amount:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Insufficient balance'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cur.execute(
-                    "UPDATE users SET balance = balance - %s WHERE user_id = %s",
-                    (amount, user_id)
-                )
-                
-                cur.execute(
-                    "INSERT INTO transactions (user_id, type, amount, status, phone, bank, description) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                    (user_id, 'withdraw', amount, 'completed', phone, bank, 'Вывод через СБП')
-                )
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Withdrawal successful'}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'topup':
-                amount = float(body_data.get('amount', 0))
-                
-                cur.execute(
-                    "UPDATE users SET balance = balance + %s WHERE user_id = %s",
-                    (amount, user_id)
-                )
-                
-                cur.execute(
-                    "INSERT INTO transactions (user_id, type, amount, status, description) VALUES (%s, %s, %s, %s, %s)",
-                    (user_id, 'topup', amount, 'completed', 'Пополнение через СБП')
-                )
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Top-up successful'}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'cardBonus':
-                bonus = 500.00
-                
-                cur.execute(
-                    "UPDATE users SET balance = balance + %s, card_earnings = card_earnings + %s WHERE user_id = %s",
-                    (bonus, bonus, user_id)
-                )
-                
-                cur.execute(
-                    "INSERT INTO transactions (user_id, type, amount, status, description) VALUES (%s, %s, %s, %s, %s)",
-                    (user_id, 'card_bonus', bonus, 'completed', 'Бонус за оформление карты')
-                )
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Card bonus added'}),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'referralBonus':
-                referred_id = body_data.get('referredId')
-                bonus = 200.00
-                
-                cur.execute(
-                    "UPDATE users SET balance = balance + %s, referral_earnings = referral_earnings + %s WHERE user_id = %s",
-                    (bonus, bonus, user_id)
-                )
-                
-                cur.execute(
-                    "INSERT INTO transactions (user_id, type, amount, status, description) VALUES (%s, %s, %s, %s, %s)",
-                    (user_id, 'referral_bonus', bonus, 'completed', 'Реферальный бонус')
-                )
-                
+            if cur.fetchone() is None:
                 cur.execute(
-                    "INSERT INTO referrals (referrer_id, referred_id, status) VALUES (%s, %s, %s)",
-                    (user_id, referred_id, 'completed')
+                    "SELECT status_code, response FROM idempotency_keys WHERE user_id = %s AND idempotency_key = %s",
+                    (user_id, idempotency_key)
                 )
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Referral bonus added'}),
-                    'isBase64Encoded': False
-                }
+                stored = cur.fetchone()
+                conn.rollback()
+                if stored is None or stored['status_code'] is None:
+                    return 409, {'error': 'Request with this idempotency key is still in progress'}
+                return stored['status_code'], stored['response']
+        
+        cur.execute("SELECT lock_ledger_account(%s)", (user_id,))
+        cur.execute(
+            """INSERT INTO transactions (user_id, type, amount, status, phone, bank, description)
+               SELECT %s, 'withdraw', %s, 'pending', %s, %s, 'Вывод через СБП'
+                 FROM account_balance(%s)
+                WHERE balance >= %s
+               RETURNING id""",
+            (user_id, amount, phone, bank, user_id, amount)
+        )
+        transaction = cur.fetchone()
+        
+        if transaction is None:
+            status_code, payload = 400, {'error': 'Insufficient balance'}
+        else:
+            status_code, payload = 200, {
+                'success': True,
+                'message': 'Withdrawal queued',
+                'transactionId': transaction['id'],
+                'status': 'pending'
+            }
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
-    
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        if idempotency_key:
+            cur.execute(
+                "UPDATE idempotency_keys SET status_code = %s, response = %s WHERE user_id = %s AND idempotency_key = %s",
+                (status_code, encode_json(payload), user_id, idempotency_key)
+            )
+        
+        conn.commit()
+        return status_code, payload
     finally:
         cur.close()
-        conn.close()
+
+def credit(conn, user_id: str, amount: float, transaction_type: str, description: str) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """INSERT INTO transactions (user_id, type, amount, status, description)
+               SELECT user_id, %s, %s, 'completed', %s FROM users WHERE user_id = %s""",
+            (transaction_type, amount, description, user_id)
+        )
+        if cur.rowcount == 0:
+            raise HttpError(404, 'User not found')
+    finally:
+        cur.close()
+
+def require_batch_caller(request: Request) -> None:
+    partner_secret = os.environ.get('BATCH_PARTNER_SECRET')
+    provided = request.headers.get('x-partner-secret')
+    if partner_secret and provided and hmac.compare_digest(provided.encode(), partner_secret.encode()):
+        return
+    require_admin_session(request)
+
+def resolve_user_id(request: Request, requested_user_id: Optional[str]) -> str:
+    token = get_session_token(request.event)
+    if token:
+        session = verify_session_token(token)
+        if not session:
+            raise HttpError(401, 'Invalid or expired session token')
+        if requested_user_id and requested_user_id != session['sub']:
+            raise HttpError(403, 'Session token does not match userId')
+        return session['sub']
+    
+    if not requested_user_id:
+        raise HttpError(400, 'userId is required')
+    return requested_user_id
+
+router = Router(
+    'wallet',
+    allow_methods='GET, POST, PUT, OPTIONS',
+    allow_headers='Content-Type, X-User-Id, X-Session-Token, Idempotency-Key, If-None-Match, X-Partner-Secret, X-Last-Write',
+    limiter=RateLimiter(RATE_LIMITS, DEFAULT_RATE_LIMIT)
+)
+
+@router.route('GET')
+def get_summary(request: Request) -> Dict[str, Any]:
+    user_id = resolve_user_id(request, request.params.get('userId'))
+    include_transactions = request.params.get('includeTransactions', 'true').lower() not in ('false', '0', 'no')
+    
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        etag = fetch_wallet_etag(request.read_conn, user_id, include_transactions)
+        if etag and etag_matches(if_none_match, etag):
+            return {
+                'statusCode': 304,
+                'headers': {**ETAG_HEADERS, 'Access-Control-Allow-Origin': '*', 'ETag': etag},
+                'body': '',
+                'isBase64Encoded': False
+            }
+    
+    read_conn = request.read_conn
+    summary = None
+    if request.on_replica:
+        summary = fetch_wallet_summary(read_conn, user_id, include_transactions, create=False)
+    if summary is None:
+        summary = fetch_wallet_summary(request.conn, user_id, include_transactions)
+    etag = wallet_etag(summary['user']['id'], summary.pop('version'), include_transactions)
+    return json_response(summary, headers={**ETAG_HEADERS, 'ETag': etag})
+
+@router.route('POST', 'batch')
+def post_batch(request: Request) -> Dict[str, Any]:
+    require_batch_caller(request)
+    operations = request.body.get('operations')
+    
+    if not isinstance(operations, list) or not operations or len(operations) > BATCH_MAX_OPERATIONS:
+        raise HttpError(400, f'operations must be a list of 1 to {BATCH_MAX_OPERATIONS} items')
+    
+    results = apply_batch(request.conn, operations)
+    applied = sum(1 for r in results if r['success'])
+    
+    return json_response({
+        'success': True,
+        'applied': applied,
+        'failed': len(results) - applied,
+        'results': results
+    })
+
+@router.route('POST', 'withdraw')
+def post_withdraw(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    user_id = resolve_user_id(request, body_data.get('userId'))
+    idempotency_key = request.headers.get('idempotency-key') or body_data.get('idempotencyKey')
+    
+    amount = parse_amount(body_data.get('amount'))
+    if amount is None:
+        raise HttpError(400, 'Invalid amount')
+    if idempotency_key and len(idempotency_key) > 100:
+        raise HttpError(400, 'Idempotency key is too long')
+    
+    status_code, payload = withdraw(
+        request.conn, user_id, amount, body_data.get('phone'), body_data.get('bank'), idempotency_key
+    )
+    return json_response(payload, status_code)
+
+@router.route('POST', 'topup')
+def post_topup(request: Request) -> Dict[str, Any]:
+    user_id = resolve_user_id(request, request.body.get('userId'))
+    amount = parse_amount(request.body.get('amount'))
+    if amount is None:
+        raise HttpError(400, 'Invalid amount')
+    
+    credit(request.conn, user_id, amount, 'topup', 'Пополнение через СБП')
+    request.conn.commit()
+    
+    return json_response({'success': True, 'message': 'Top-up successful'})
+
+@router.route('POST', 'cardBonus')
+def post_card_bonus(request: Request) -> Dict[str, Any]:
+    user_id = resolve_user_id(request, request.body.get('userId'))
+    
+    credit(request.conn, user_id, CARD_BONUS, 'card_bonus', 'Бонус за оформление карты')
+    request.conn.commit()
+    
+    return json_response({'success': True, 'message': 'Card bonus added'})
+
+@router.route('POST', 'referralBonus')
+def post_referral_bonus(request: Request) -> Dict[str, Any]:
+    user_id = resolve_user_id(request, request.body.get('userId'))
+    referred_id = request.body.get('referredId')
+    
+    credit(request.conn, user_id, REFERRAL_BONUS, 'referral_bonus', 'Реферальный бонус')
+    
+    cur = request.conn.cursor()
+    cur.execute(
+        "INSERT INTO referrals (referrer_id, referred_id, status) VALUES (%s, %s, %s)",
+        (user_id, referred_id, 'completed')
+    )
+    cur.close()
+    request.conn.commit()
+    
+    return json_response({'success': True, 'message': 'Referral bonus added'})
+
+@router.route('GET', 'referrals')
+def get_referrals(request: Request) -> Dict[str, Any]:
+    user_id = resolve_user_id(request, request.params.get('userId'))
+    
+    cur = request.read_cursor()
+    cur.execute("SELECT referral_summary(%s) AS summary", (user_id,))
+    return json_response({'userId': user_id, **cur.fetchone()['summary']})
+
+@router.route('GET', 'metrics')
+def get_metrics(request: Request) -> Dict[str, Any]:
+    require_admin_session(request)
+    return json_response(router.metrics())
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
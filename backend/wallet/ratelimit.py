@@ -0,0 +1,170 @@
+'''
+Business: Ограничение частоты запросов по пользователю и IP через token bucket до обращения к базе
+'''
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from api import json_response
+from tokens import get_session_token, verify_session_token
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 10000))
+RATE_LIMIT_PURGE_EVERY = int(os.environ.get('RATE_LIMIT_PURGE_EVERY', 1000))
+
+
+class Limit:
+    __slots__ = ('rate', 'burst')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+
+
+class TokenBuckets:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}
+
+    def take(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict(now, limit)
+                bucket = self._buckets[key] = [limit.burst, now, 0.0]
+            if now < bucket[2]:
+                return bucket[2] - now
+
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / limit.rate
+
+    def block(self, key: str, seconds: float) -> None:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = 0.0
+                bucket[2] = time.monotonic() + seconds
+
+    def _evict(self, now: float, limit: Limit) -> None:
+        full_after = limit.burst / limit.rate
+        for key in [key for key, bucket in self._buckets.items() if now - bucket[1] >= full_after and now >= bucket[2]]:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            oldest = sorted(self._buckets, key=lambda key: self._buckets[key][1])
+            for key in oldest[:len(oldest) // 2]:
+                del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def source_ip(request) -> Optional[str]:
+    identity = (request.event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    forwarded = request.headers.get('x-forwarded-for') or request.headers.get('x-real-ip')
+    return forwarded.split(',')[0].strip() if forwarded else None
+
+
+def caller_user_id(request) -> Optional[str]:
+    token = get_session_token(request.event)
+    session = verify_session_token(token) if token else None
+    if session:
+        return session['sub']
+    user_id = request.params.get('userId') or request.body.get('userId')
+    return str(user_id) if user_id else None
+
+
+def rate_limit_response(retry_after: float) -> Dict[str, Any]:
+    return json_response(
+        {'error': 'Too many requests', 'retryAfter': round(retry_after, 3)},
+        429,
+        {'Retry-After': str(max(1, math.ceil(retry_after))), 'Access-Control-Expose-Headers': 'Retry-After'}
+    )
+
+
+# limits map a route such as 'POST topup' to (per_user, per_ip); either side may be None. Buckets live in
+# process memory, so a denial costs no DB round trip. With RATE_LIMIT_BACKEND=postgres a request that passes
+# locally also takes a token from the shared rate_limit_buckets row, and a shared denial blocks the local
+# bucket until it refills so that repeated 429s stay local. RATE_LIMIT_BACKEND=off disables limiting.
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Tuple[Optional[Limit], Optional[Limit]]],
+                 default: Tuple[Optional[Limit], Optional[Limit]] = (None, None),
+                 backend: str = RATE_LIMIT_BACKEND):
+        if backend not in ('off', 'memory', 'postgres'):
+            raise ValueError(f'Unknown rate limit backend {backend!r}')
+        self.limits = limits
+        self.default = default
+        self.backend = backend
+        self.shared = backend == 'postgres'
+        self._shared_calls = 0
+        self.buckets = TokenBuckets()
+        self._lock = threading.Lock()
+        self._limited: Dict[str, int] = {}
+
+    def _keys(self, request) -> List[Tuple[str, Limit]]:
+        route = request.route
+        per_user, per_ip = self.limits.get(route, self.default)
+        keys: List[Tuple[str, Limit]] = []
+        if per_user is not None:
+            user_id = caller_user_id(request)
+            if user_id:
+                keys.append((f'{route}|user:{user_id}', per_user))
+        if per_ip is not None:
+            ip = source_ip(request)
+            if ip:
+                keys.append((f'{route}|ip:{ip}', per_ip))
+        return keys
+
+    def _take_shared(self, request, key: str, limit: Limit) -> float:
+        conn = request.conn
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "SELECT take_rate_limit_token(%s, %s, %s) AS retry_after",
+                (key, limit.rate, limit.burst)
+            )
+            retry_after = float(cur.fetchone()['retry_after'])
+            self._shared_calls += 1
+            if self._shared_calls % RATE_LIMIT_PURGE_EVERY == 0:
+                cur.execute("SELECT purge_rate_limit_buckets()")
+        finally:
+            cur.close()
+        conn.commit()
+        return retry_after
+
+    def check(self, request) -> Optional[Dict[str, Any]]:
+        if self.backend == 'off':
+            return None
+        keys = self._keys(request)
+        retry_after = 0.0
+        for key, limit in keys:
+            retry_after = max(retry_after, self.buckets.take(key, limit))
+
+        if not retry_after and self.shared:
+            for key, limit in keys:
+                shared_retry = self._take_shared(request, key, limit)
+                if shared_retry:
+                    self.buckets.block(key, shared_retry)
+                    retry_after = max(retry_after, shared_retry)
+
+        if not retry_after:
+            return None
+        with self._lock:
+            self._limited[request.route] = self._limited.get(request.route, 0) + 1
+        return rate_limit_response(retry_after)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            limited = dict(self._limited)
+        return {'backend': self.backend, 'keys': len(self.buckets), 'limited': limited}
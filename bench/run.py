@@ -0,0 +1,214 @@
+'''
+Business: Нагрузочный прогон обработчиков облачных функций по сценариям из tests.json с отчётом о задержках
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+PLACEHOLDER_USER = 'TEST123'
+
+
+class Context:
+    def __init__(self):
+        self.request_id = str(uuid.uuid4())
+
+
+def load_function(name: str, concurrency: int):
+    os.environ.setdefault('METRICS_LOG', '0')
+    os.environ.setdefault('RATE_LIMIT_BACKEND', 'off')
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(concurrency))
+    sys.path.insert(0, os.path.join(BACKEND_DIR, name))
+    import index
+    import metrics
+    return index, metrics
+
+
+def load_scenarios(name: str, weights: Dict[str, float]) -> List[Dict[str, Any]]:
+    with open(os.path.join(BACKEND_DIR, name, 'tests.json')) as f:
+        tests = json.load(f)['tests']
+    unknown = set(weights) - {t['name'] for t in tests}
+    if unknown:
+        raise SystemExit(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+    scenarios = [t for t in tests if weights.get(t['name'], 1.0) > 0]
+    if not scenarios:
+        raise SystemExit('No scenarios selected')
+    return scenarios
+
+
+def build_event(test: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    raw = json.dumps(test).replace(PLACEHOLDER_USER, user_id)
+    test = json.loads(raw)
+    url = urlsplit(test.get('path', '/'))
+    params = dict(parse_qsl(url.query))
+    body = test.get('body')
+    return {
+        'httpMethod': test['method'],
+        'path': url.path,
+        'queryStringParameters': params or None,
+        'headers': test.get('headers', {}),
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False
+    }
+
+
+def parse_weights(values: List[str]) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for value in values:
+        name, sep, weight = value.rpartition('=')
+        if not sep:
+            raise SystemExit(f'Weight must look like NAME=WEIGHT: {value}')
+        weights[name] = float(weight)
+    return weights
+
+
+def run(handler, scenarios: List[Dict[str, Any]], weights: Dict[str, float], args) -> Dict[str, Dict[str, Any]]:
+    lock = threading.Lock()
+    results: Dict[str, Dict[str, Any]] = {t['name']: {'latencies': [], 'failures': 0} for t in scenarios}
+    scenario_weights = [weights.get(t['name'], 1.0) for t in scenarios]
+    remaining = [args.requests]
+
+    def next_request() -> bool:
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        while next_request():
+            test = rng.choices(scenarios, scenario_weights)[0]
+            user_id = f'{args.user_prefix}{rng.randint(1, args.users)}' if args.users else PLACEHOLDER_USER
+            event = build_event(test, user_id)
+            started = time.perf_counter()
+            response = handler(event, Context())
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            failed = response['statusCode'] != test.get('expectedStatus', 200)
+            with lock:
+                entry = results[test['name']]
+                entry['latencies'].append(elapsed_ms)
+                if failed:
+                    entry['failures'] += 1
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for future in [executor.submit(worker, args.seed + i) for i in range(args.concurrency)]:
+            future.result()
+    return results
+
+
+def build_report(name: str, results: Dict[str, Dict[str, Any]], elapsed: float,
+                 actions: Dict[str, Dict[str, Any]], percentile, args) -> Dict[str, Any]:
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    for scenario, entry in results.items():
+        latencies = sorted(entry['latencies'])
+        if not latencies:
+            continue
+        scenarios[scenario] = {
+            'count': len(latencies),
+            'failures': entry['failures'],
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': percentile(latencies, 100)
+        }
+    total = sum(s['count'] for s in scenarios.values())
+    return {
+        'function': name,
+        'concurrency': args.concurrency,
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'scenarios': scenarios,
+        'actions': {key: {'count': a['count'], 'avg_queries': a['avg_queries'],
+                          'avg_rows': a['avg_rows'], 'db_ms_p95': a['db_ms']['p95']}
+                    for key, a in actions.items()}
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['function']}: {report['requests']} requests in {report['elapsed_s']}s "
+          f"({report['rps']} req/s, concurrency {report['concurrency']})")
+    print(f"{'scenario':<45}{'count':>8}{'fail':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, s in report['scenarios'].items():
+        print(f"{name:<45}{s['count']:>8}{s['failures']:>6}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+    print(f"\n{'action':<45}{'count':>8}{'queries':>10}{'rows':>10}{'db p95':>10}")
+    for key, a in report['actions'].items():
+        print(f"{key:<45}{a['count']:>8}{a['avg_queries']:>10}{a['avg_rows']:>10}{a['db_ms_p95']:>10}")
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions: List[str] = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous and current['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95']}ms -> {current['p95']}ms")
+    for key, current in report['actions'].items():
+        previous = baseline.get('actions', {}).get(key)
+        if previous and current['avg_queries'] > previous['avg_queries']:
+            regressions.append(f"{key}: queries per request {previous['avg_queries']} -> {current['avg_queries']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Replay tests.json scenarios against a function handler')
+    parser.add_argument('function', help='Function directory under backend/, e.g. wallet')
+    parser.add_argument('-n', '--requests', type=int, default=1000, help='Measured requests')
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('-w', '--weight', action='append', default=[], metavar='NAME=WEIGHT',
+                        help='Relative weight of a scenario; 0 disables it')
+    parser.add_argument('--warmup', type=int, default=50, help='Requests replayed before measuring')
+    parser.add_argument('--users', type=int, default=0,
+                        help=f'Replace {PLACEHOLDER_USER} with a random seeded user from 1..N')
+    parser.add_argument('--user-prefix', default='bench_')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the JSON report to this path')
+    parser.add_argument('--baseline', help='Fail when p95 or queries per request regress against this report')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 growth over the baseline')
+    args = parser.parse_args(argv)
+
+    index, metrics = load_function(args.function, args.concurrency)
+    weights = parse_weights(args.weight)
+    scenarios = load_scenarios(args.function, weights)
+
+    if args.warmup:
+        measured = args.requests
+        args.requests = args.warmup
+        run(index.handler, scenarios, weights, args)
+        args.requests = measured
+        index.router.stats = metrics.ActionStats()
+
+    started = time.perf_counter()
+    results = run(index.handler, scenarios, weights, args)
+    elapsed = time.perf_counter() - started
+
+    report = build_report(args.function, results, elapsed, index.router.stats.snapshot(), metrics.percentile, args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        regressions = compare_with_baseline(report, args.baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
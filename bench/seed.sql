@@ -0,0 +1,54 @@
+\if :{?users}
+\else
+\set users 1000000
+\endif
+\if :{?transactions}
+\else
+\set transactions 50000000
+\endif
+
+SELECT create_transactions_partition(month_start::DATE)
+  FROM generate_series(date_trunc('month', now() - interval '365 days'), now(), interval '1 month') AS month_start;
+
+ALTER TABLE users DISABLE TRIGGER USER;
+ALTER TABLE transactions DISABLE TRIGGER USER;
+ALTER TABLE referrals DISABLE TRIGGER USER;
+ALTER TABLE ledger_entries DISABLE TRIGGER USER;
+ALTER TABLE transactions ENABLE TRIGGER trg_transactions_ledger;
+ALTER TABLE referrals ENABLE TRIGGER trg_referrals_tree;
+
+INSERT INTO users (user_id, referral_code, referred_by, created_at, updated_at)
+SELECT 'bench_' || g,
+       'bench_' || g,
+       CASE WHEN g > 1 AND random() < 0.3 THEN 'bench_' || (1 + floor(random() * (g - 1)))::int END,
+       now() - random() * interval '365 days',
+       now()
+  FROM generate_series(1, :users) AS g
+ON CONFLICT (user_id) DO NOTHING;
+
+INSERT INTO transactions (user_id, type, amount, status, description, created_at)
+SELECT 'bench_' || (1 + floor(random() * :users))::int,
+       (ARRAY['topup', 'withdraw', 'card_bonus', 'referral_bonus'])[1 + floor(random() * 4)::int],
+       round((random() * 5000)::numeric, 2),
+       CASE WHEN random() < 0.95 THEN 'completed' ELSE 'pending' END,
+       'bench',
+       now() - random() * interval '365 days'
+  FROM generate_series(1, :transactions);
+
+INSERT INTO referrals (referrer_id, referred_id, status, created_at)
+SELECT referred_by, user_id, 'completed', created_at
+  FROM users
+ WHERE user_id LIKE 'bench\_%' AND referred_by IS NOT NULL
+ ORDER BY id;
+
+ALTER TABLE users ENABLE TRIGGER USER;
+ALTER TABLE transactions ENABLE TRIGGER USER;
+ALTER TABLE referrals ENABLE TRIGGER USER;
+ALTER TABLE ledger_entries ENABLE TRIGGER USER;
+
+SELECT take_balance_snapshots();
+SELECT recompute_platform_stats();
+ANALYZE users;
+ANALYZE transactions;
+ANALYZE referrals;
+ANALYZE ledger_entries;
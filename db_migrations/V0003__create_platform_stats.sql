@@ -0,0 +1,133 @@
+CREATE TABLE IF NOT EXISTS platform_stats (
+    name VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL,
+    value NUMERIC(20, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE OR REPLACE FUNCTION bump_platform_stat(stat_name TEXT, delta NUMERIC) RETURNS VOID AS $$
+BEGIN
+    IF delta <> 0 THEN
+        INSERT INTO platform_stats (name, shard, value)
+        VALUES (stat_name, floor(random() * 16)::SMALLINT, delta)
+        ON CONFLICT (name, shard) DO UPDATE SET value = platform_stats.value + EXCLUDED.value;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION platform_stats_users() RETURNS TRIGGER AS $$
+DECLARE
+    users_delta BIGINT := 0;
+    balance_delta NUMERIC := 0;
+    rows_count BIGINT;
+    rows_balance NUMERIC;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*), COALESCE(SUM(balance), 0) INTO rows_count, rows_balance FROM new_rows;
+        users_delta := users_delta + rows_count;
+        balance_delta := balance_delta + rows_balance;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*), COALESCE(SUM(balance), 0) INTO rows_count, rows_balance FROM old_rows;
+        users_delta := users_delta - rows_count;
+        balance_delta := balance_delta - rows_balance;
+    END IF;
+    PERFORM bump_platform_stat('total_users', users_delta);
+    PERFORM bump_platform_stat('total_balance', balance_delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION platform_stats_transactions() RETURNS TRIGGER AS $$
+DECLARE
+    withdrawals_delta BIGINT := 0;
+    topups_delta BIGINT := 0;
+    rows_withdrawals BIGINT;
+    rows_topups BIGINT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*) FILTER (WHERE type = 'withdraw' AND status = 'completed'),
+               COUNT(*) FILTER (WHERE type = 'topup' AND status = 'completed')
+          INTO rows_withdrawals, rows_topups FROM new_rows;
+        withdrawals_delta := withdrawals_delta + rows_withdrawals;
+        topups_delta := topups_delta + rows_topups;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*) FILTER (WHERE type = 'withdraw' AND status = 'completed'),
+               COUNT(*) FILTER (WHERE type = 'topup' AND status = 'completed')
+          INTO rows_withdrawals, rows_topups FROM old_rows;
+        withdrawals_delta := withdrawals_delta - rows_withdrawals;
+        topups_delta := topups_delta - rows_topups;
+    END IF;
+    PERFORM bump_platform_stat('total_withdrawals', withdrawals_delta);
+    PERFORM bump_platform_stat('total_topups', topups_delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION platform_stats_referrals() RETURNS TRIGGER AS $$
+DECLARE
+    referrals_delta BIGINT := 0;
+    rows_count BIGINT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*) FILTER (WHERE status = 'completed') INTO rows_count FROM new_rows;
+        referrals_delta := referrals_delta + rows_count;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*) FILTER (WHERE status = 'completed') INTO rows_count FROM old_rows;
+        referrals_delta := referrals_delta - rows_count;
+    END IF;
+    PERFORM bump_platform_stat('total_referrals', referrals_delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_platform_stats_users_insert AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_users();
+CREATE TRIGGER trg_platform_stats_users_update AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_users();
+CREATE TRIGGER trg_platform_stats_users_delete AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_users();
+
+CREATE TRIGGER trg_platform_stats_transactions_insert AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_transactions();
+CREATE TRIGGER trg_platform_stats_transactions_update AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_transactions();
+CREATE TRIGGER trg_platform_stats_transactions_delete AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_transactions();
+
+CREATE TRIGGER trg_platform_stats_referrals_insert AFTER INSERT ON referrals
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_referrals();
+CREATE TRIGGER trg_platform_stats_referrals_update AFTER UPDATE ON referrals
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_referrals();
+CREATE TRIGGER trg_platform_stats_referrals_delete AFTER DELETE ON referrals
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_referrals();
+
+CREATE OR REPLACE FUNCTION recompute_platform_stats() RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE users, transactions, referrals IN SHARE MODE;
+    DELETE FROM platform_stats;
+    INSERT INTO platform_stats (name, shard, value)
+    SELECT 'total_users', 0, COUNT(*) FROM users
+    UNION ALL
+    SELECT 'total_balance', 0, COALESCE(SUM(balance), 0) FROM users
+    UNION ALL
+    SELECT 'total_withdrawals', 0, COUNT(*) FROM transactions WHERE type = 'withdraw' AND status = 'completed'
+    UNION ALL
+    SELECT 'total_topups', 0, COUNT(*) FROM transactions WHERE type = 'topup' AND status = 'completed'
+    UNION ALL
+    SELECT 'total_referrals', 0, COUNT(*) FROM referrals WHERE status = 'completed';
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT recompute_platform_stats();
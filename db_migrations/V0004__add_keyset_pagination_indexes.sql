@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_created_at_id ON transactions(created_at DESC, id DESC);
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(100) NOT NULL,
+    action VARCHAR(30) NOT NULL,
+    status_code INTEGER,
+    response JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
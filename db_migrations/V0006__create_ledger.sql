@@ -0,0 +1,207 @@
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    id BIGSERIAL PRIMARY KEY,
+    transaction_id INTEGER NOT NULL,
+    account VARCHAR(50) NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    amount NUMERIC(12, 2) NOT NULL,
+    xid BIGINT NOT NULL DEFAULT txid_current(),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_ledger_entries_account_xid ON ledger_entries(account, xid);
+CREATE INDEX IF NOT EXISTS idx_ledger_entries_xid ON ledger_entries(xid);
+CREATE INDEX IF NOT EXISTS idx_ledger_entries_transaction_id ON ledger_entries(transaction_id);
+
+CREATE TABLE IF NOT EXISTS balance_snapshots (
+    account VARCHAR(50) NOT NULL,
+    boundary_xid BIGINT NOT NULL,
+    balance NUMERIC(14, 2) NOT NULL,
+    card_earnings NUMERIC(14, 2) NOT NULL,
+    referral_earnings NUMERIC(14, 2) NOT NULL,
+    taken_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (account, boundary_xid)
+);
+
+CREATE TABLE IF NOT EXISTS balance_snapshot_runs (
+    boundary_xid BIGINT PRIMARY KEY,
+    accounts INTEGER NOT NULL,
+    taken_at TIMESTAMP NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION reject_ledger_changes() RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'ledger_entries is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_ledger_entries_append_only BEFORE UPDATE OR DELETE ON ledger_entries
+    FOR EACH ROW EXECUTE FUNCTION reject_ledger_changes();
+CREATE TRIGGER trg_ledger_entries_no_truncate BEFORE TRUNCATE ON ledger_entries
+    FOR EACH STATEMENT EXECUTE FUNCTION reject_ledger_changes();
+
+-- Every completed transaction is posted as two balancing legs: the user account and a system account
+CREATE OR REPLACE FUNCTION post_transactions_to_ledger() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO ledger_entries (transaction_id, account, kind, amount)
+    SELECT t.id, leg.account, t.type, leg.amount
+      FROM new_rows t
+     CROSS JOIN LATERAL (VALUES
+         (t.user_id, CASE WHEN t.type = 'withdraw' THEN -t.amount ELSE t.amount END),
+         (CASE t.type
+              WHEN 'topup' THEN 'system:topup'
+              WHEN 'withdraw' THEN 'system:payout'
+              WHEN 'adjustment' THEN 'system:adjustment'
+              ELSE 'system:bonus'
+          END,
+          CASE WHEN t.type = 'withdraw' THEN t.amount ELSE -t.amount END)
+     ) AS leg(account, amount)
+     WHERE t.status = 'completed';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_transactions_ledger AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_transactions_to_ledger();
+
+-- Serializes debits of one account; credits never take it
+CREATE OR REPLACE FUNCTION lock_ledger_account(p_account VARCHAR) RETURNS VOID AS $$
+    SELECT pg_advisory_xact_lock(hashtext('ledger_entries'), hashtext(p_account));
+$$ LANGUAGE sql;
+
+-- Latest snapshot taken before p_as_of plus the entries written after its boundary
+CREATE OR REPLACE FUNCTION account_balance(p_account VARCHAR, p_as_of TIMESTAMP DEFAULT NULL)
+RETURNS TABLE (balance NUMERIC, card_earnings NUMERIC, referral_earnings NUMERIC) AS $$
+    WITH snapshot AS (
+        SELECT s.boundary_xid, s.balance, s.card_earnings, s.referral_earnings
+          FROM balance_snapshots s
+         WHERE s.account = p_account AND (p_as_of IS NULL OR s.taken_at <= p_as_of)
+         ORDER BY s.boundary_xid DESC
+         LIMIT 1
+    )
+    SELECT (COALESCE((SELECT balance FROM snapshot), 0) + COALESCE(SUM(e.amount), 0))::NUMERIC(14, 2),
+           (COALESCE((SELECT card_earnings FROM snapshot), 0)
+               + COALESCE(SUM(e.amount) FILTER (WHERE e.kind = 'card_bonus'), 0))::NUMERIC(14, 2),
+           (COALESCE((SELECT referral_earnings FROM snapshot), 0)
+               + COALESCE(SUM(e.amount) FILTER (WHERE e.kind = 'referral_bonus'), 0))::NUMERIC(14, 2)
+      FROM ledger_entries e
+     WHERE e.account = p_account
+       AND e.xid >= COALESCE((SELECT boundary_xid FROM snapshot), 0)
+       AND (p_as_of IS NULL OR e.created_at <= p_as_of);
+$$ LANGUAGE sql STABLE;
+
+-- Entries below the xmin of the current snapshot belong to finished transactions, so they
+-- can be folded into a snapshot without missing rows that are still being committed
+CREATE OR REPLACE FUNCTION take_balance_snapshots() RETURNS INTEGER AS $$
+DECLARE
+    previous_boundary BIGINT;
+    boundary BIGINT;
+    snapshot_time TIMESTAMP;
+    taken INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('balance_snapshots'));
+    SELECT COALESCE(MAX(boundary_xid), 0) INTO previous_boundary FROM balance_snapshot_runs;
+    boundary := txid_snapshot_xmin(txid_current_snapshot());
+    snapshot_time := clock_timestamp();
+
+    INSERT INTO balance_snapshots (account, boundary_xid, balance, card_earnings, referral_earnings, taken_at)
+    SELECT tail.account,
+           boundary,
+           COALESCE(latest.balance, 0) + tail.balance,
+           COALESCE(latest.card_earnings, 0) + tail.card_earnings,
+           COALESCE(latest.referral_earnings, 0) + tail.referral_earnings,
+           snapshot_time
+      FROM (SELECT account,
+                   SUM(amount) AS balance,
+                   COALESCE(SUM(amount) FILTER (WHERE kind = 'card_bonus'), 0) AS card_earnings,
+                   COALESCE(SUM(amount) FILTER (WHERE kind = 'referral_bonus'), 0) AS referral_earnings
+              FROM ledger_entries
+             WHERE xid >= previous_boundary AND xid < boundary
+             GROUP BY account) AS tail
+      LEFT JOIN LATERAL (
+          SELECT s.balance, s.card_earnings, s.referral_earnings
+            FROM balance_snapshots s
+           WHERE s.account = tail.account
+           ORDER BY s.boundary_xid DESC
+           LIMIT 1
+      ) AS latest ON TRUE;
+    GET DIAGNOSTICS taken = ROW_COUNT;
+
+    INSERT INTO balance_snapshot_runs (boundary_xid, accounts, taken_at)
+    VALUES (boundary, taken, snapshot_time)
+    ON CONFLICT (boundary_xid) DO NOTHING;
+    RETURN taken;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Opening balances move from the users columns into the first snapshot
+INSERT INTO balance_snapshots (account, boundary_xid, balance, card_earnings, referral_earnings, taken_at)
+SELECT user_id, txid_snapshot_xmin(txid_current_snapshot()),
+       COALESCE(balance, 0), COALESCE(card_earnings, 0), COALESCE(referral_earnings, 0), CURRENT_TIMESTAMP
+  FROM users
+UNION ALL
+SELECT 'system:opening', txid_snapshot_xmin(txid_current_snapshot()),
+       -COALESCE(SUM(balance), 0), 0, 0, CURRENT_TIMESTAMP
+  FROM users;
+
+INSERT INTO balance_snapshot_runs (boundary_xid, accounts, taken_at)
+SELECT txid_snapshot_xmin(txid_current_snapshot()), COUNT(*), CURRENT_TIMESTAMP FROM balance_snapshots;
+
+CREATE OR REPLACE FUNCTION platform_stats_users() RETURNS TRIGGER AS $$
+DECLARE
+    users_delta BIGINT := 0;
+    rows_count BIGINT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COUNT(*) INTO rows_count FROM new_rows;
+        users_delta := users_delta + rows_count;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COUNT(*) INTO rows_count FROM old_rows;
+        users_delta := users_delta - rows_count;
+    END IF;
+    PERFORM bump_platform_stat('total_users', users_delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION platform_stats_ledger() RETURNS TRIGGER AS $$
+DECLARE
+    balance_delta NUMERIC;
+BEGIN
+    SELECT COALESCE(SUM(amount), 0) INTO balance_delta FROM new_rows WHERE account NOT LIKE 'system:%';
+    PERFORM bump_platform_stat('total_balance', balance_delta);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_platform_stats_ledger_insert AFTER INSERT ON ledger_entries
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_ledger();
+
+CREATE OR REPLACE FUNCTION recompute_platform_stats() RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE users, transactions, referrals IN SHARE MODE;
+    DELETE FROM platform_stats;
+    INSERT INTO platform_stats (name, shard, value)
+    SELECT 'total_users', 0, COUNT(*) FROM users
+    UNION ALL
+    SELECT 'total_balance', 0, COALESCE(SUM(b.balance), 0)
+      FROM users u CROSS JOIN LATERAL account_balance(u.user_id) b
+    UNION ALL
+    SELECT 'total_withdrawals', 0, COUNT(*) FROM transactions WHERE type = 'withdraw' AND status = 'completed'
+    UNION ALL
+    SELECT 'total_topups', 0, COUNT(*) FROM transactions WHERE type = 'topup' AND status = 'completed'
+    UNION ALL
+    SELECT 'total_referrals', 0, COUNT(*) FROM referrals WHERE status = 'completed';
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE users DROP COLUMN IF EXISTS balance;
+ALTER TABLE users DROP COLUMN IF EXISTS card_earnings;
+ALTER TABLE users DROP COLUMN IF EXISTS referral_earnings;
+
+CREATE OR REPLACE VIEW users_with_balance AS
+SELECT u.*, b.balance, b.card_earnings, b.referral_earnings
+  FROM users u
+ CROSS JOIN LATERAL account_balance(u.user_id) b;
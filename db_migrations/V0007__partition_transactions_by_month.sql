@@ -0,0 +1,125 @@
+ALTER TABLE transactions RENAME TO transactions_legacy;
+DROP INDEX IF EXISTS idx_transactions_user_id;
+DROP INDEX IF EXISTS idx_transactions_created_at_id;
+
+CREATE TABLE transactions (
+    id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+    user_id VARCHAR(50) NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending',
+    description TEXT,
+    phone VARCHAR(20),
+    bank VARCHAR(50),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+CREATE INDEX idx_transactions_user_id_created_at ON transactions(user_id, created_at DESC);
+CREATE INDEX idx_transactions_created_at_id ON transactions(created_at DESC, id DESC);
+
+-- Rows that landed in the default partition for this month are moved into the new partition
+CREATE OR REPLACE FUNCTION create_transactions_partition(month_start DATE) RETURNS BOOLEAN AS $$
+DECLARE
+    partition_name TEXT := 'transactions_' || to_char(month_start, 'YYYY_MM');
+    month_end DATE := (month_start + INTERVAL '1 month')::DATE;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM transactions_default WHERE created_at >= %L AND created_at < %L RETURNING *)
+         INSERT INTO %I SELECT * FROM moved',
+        month_start, month_end, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+    );
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ensure_transactions_partitions(months_ahead INTEGER DEFAULT 3) RETURNS INTEGER AS $$
+    SELECT COUNT(*)::INTEGER
+      FROM generate_series(
+               date_trunc('month', CURRENT_TIMESTAMP),
+               date_trunc('month', CURRENT_TIMESTAMP) + make_interval(months => months_ahead),
+               INTERVAL '1 month'
+           ) AS month_start
+     WHERE create_transactions_partition(month_start::DATE);
+$$ LANGUAGE sql;
+
+SELECT create_transactions_partition(month_start::DATE)
+  FROM generate_series(
+           date_trunc('month', COALESCE((SELECT MIN(created_at) FROM transactions_legacy), CURRENT_TIMESTAMP)),
+           date_trunc('month', CURRENT_TIMESTAMP),
+           INTERVAL '1 month'
+       ) AS month_start;
+SELECT ensure_transactions_partitions();
+
+INSERT INTO transactions (id, user_id, type, amount, status, description, phone, bank, created_at)
+SELECT id, user_id, type, amount, status, description, phone, bank, COALESCE(created_at, 'epoch')
+  FROM transactions_legacy;
+
+ALTER SEQUENCE transactions_id_seq OWNED BY NONE;
+DROP TABLE transactions_legacy;
+ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
+
+CREATE TRIGGER trg_platform_stats_transactions_insert AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_transactions();
+CREATE TRIGGER trg_platform_stats_transactions_update AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_transactions();
+CREATE TRIGGER trg_platform_stats_transactions_delete AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION platform_stats_transactions();
+CREATE TRIGGER trg_transactions_ledger AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION post_transactions_to_ledger();
+
+CREATE TABLE IF NOT EXISTS transactions_archive (
+    partition_name VARCHAR(50) PRIMARY KEY,
+    month_start DATE NOT NULL,
+    rows_count BIGINT NOT NULL,
+    withdrawals BIGINT NOT NULL,
+    topups BIGINT NOT NULL,
+    data BYTEA NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Archived months keep counting towards the platform totals
+CREATE OR REPLACE FUNCTION recompute_platform_stats() RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE users, transactions, referrals IN SHARE MODE;
+    DELETE FROM platform_stats;
+    INSERT INTO platform_stats (name, shard, value)
+    SELECT 'total_users', 0, COUNT(*) FROM users
+    UNION ALL
+    SELECT 'total_balance', 0, COALESCE(SUM(b.balance), 0)
+      FROM users u CROSS JOIN LATERAL account_balance(u.user_id) b
+    UNION ALL
+    SELECT 'total_withdrawals', 0,
+           (SELECT COUNT(*) FROM transactions WHERE type = 'withdraw' AND status = 'completed')
+           + (SELECT COALESCE(SUM(withdrawals), 0) FROM transactions_archive)
+    UNION ALL
+    SELECT 'total_topups', 0,
+           (SELECT COUNT(*) FROM transactions WHERE type = 'topup' AND status = 'completed')
+           + (SELECT COALESCE(SUM(topups), 0) FROM transactions_archive)
+    UNION ALL
+    SELECT 'total_referrals', 0, COUNT(*) FROM referrals WHERE status = 'completed';
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('ensure_transactions_partitions', '0 3 * * *',
+                              'SELECT ensure_transactions_partitions()');
+    END IF;
+END;
+$$;
@@ -0,0 +1,138 @@
+CREATE TABLE IF NOT EXISTS referral_tree (
+    referred_id VARCHAR(50) PRIMARY KEY,
+    referrer_id VARCHAR(50) NOT NULL,
+    reward_amount NUMERIC(10, 2) NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS referral_closure (
+    ancestor_id VARCHAR(50) NOT NULL,
+    descendant_id VARCHAR(50) NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant ON referral_closure(descendant_id, depth);
+
+CREATE TABLE IF NOT EXISTS referral_levels (
+    ancestor_id VARCHAR(50) NOT NULL,
+    depth INTEGER NOT NULL,
+    members BIGINT NOT NULL DEFAULT 0,
+    rewards NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (ancestor_id, depth)
+);
+
+CREATE TABLE IF NOT EXISTS referral_totals (
+    user_id VARCHAR(50) PRIMARY KEY,
+    direct_count BIGINT NOT NULL DEFAULT 0,
+    downline_size BIGINT NOT NULL DEFAULT 0,
+    max_depth INTEGER NOT NULL DEFAULT 0,
+    rewards NUMERIC(14, 2) NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_referral_totals_downline ON referral_totals(downline_size DESC, user_id);
+CREATE INDEX IF NOT EXISTS idx_referral_totals_direct ON referral_totals(direct_count DESC, user_id);
+CREATE INDEX IF NOT EXISTS idx_referral_totals_rewards ON referral_totals(rewards DESC, user_id);
+
+-- The first completed referral of a user becomes its parent edge; self-referrals and cycles are ignored.
+-- The referred user's existing subtree is attached under every ancestor of the referrer.
+CREATE OR REPLACE FUNCTION add_referral_edge(p_referrer VARCHAR, p_referred VARCHAR, p_reward NUMERIC) RETURNS BOOLEAN AS $$
+BEGIN
+    IF p_referrer IS NULL OR p_referred IS NULL OR p_referrer = p_referred THEN
+        RETURN FALSE;
+    END IF;
+    IF EXISTS (SELECT 1 FROM referral_closure WHERE ancestor_id = p_referred AND descendant_id = p_referrer) THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO referral_tree (referred_id, referrer_id, reward_amount)
+    VALUES (p_referred, p_referrer, COALESCE(p_reward, 0))
+    ON CONFLICT (referred_id) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    WITH new_paths AS (
+        INSERT INTO referral_closure (ancestor_id, descendant_id, depth)
+        SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+          FROM (SELECT ancestor_id, depth FROM referral_closure WHERE descendant_id = p_referrer
+                UNION ALL
+                SELECT p_referrer, 0) AS up
+         CROSS JOIN (SELECT descendant_id, depth FROM referral_closure WHERE ancestor_id = p_referred
+                     UNION ALL
+                     SELECT p_referred, 0) AS down
+        RETURNING ancestor_id, descendant_id, depth
+    ), level_deltas AS (
+        SELECT p.ancestor_id, p.depth, COUNT(*) AS members, SUM(t.reward_amount) AS rewards
+          FROM new_paths p
+          JOIN referral_tree t ON t.referred_id = p.descendant_id
+         GROUP BY p.ancestor_id, p.depth
+    ), levels AS (
+        INSERT INTO referral_levels (ancestor_id, depth, members, rewards)
+        SELECT ancestor_id, depth, members, rewards FROM level_deltas
+        ON CONFLICT (ancestor_id, depth) DO UPDATE
+            SET members = referral_levels.members + EXCLUDED.members,
+                rewards = referral_levels.rewards + EXCLUDED.rewards
+    )
+    INSERT INTO referral_totals (user_id, direct_count, downline_size, max_depth, rewards)
+    SELECT ancestor_id,
+           COALESCE(SUM(members) FILTER (WHERE depth = 1), 0),
+           SUM(members),
+           MAX(depth),
+           SUM(rewards)
+      FROM level_deltas
+     GROUP BY ancestor_id
+    ON CONFLICT (user_id) DO UPDATE
+        SET direct_count = referral_totals.direct_count + EXCLUDED.direct_count,
+            downline_size = referral_totals.downline_size + EXCLUDED.downline_size,
+            max_depth = GREATEST(referral_totals.max_depth, EXCLUDED.max_depth),
+            rewards = referral_totals.rewards + EXCLUDED.rewards;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION referrals_to_tree() RETURNS TRIGGER AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('referral_tree'));
+    FOR r IN SELECT referrer_id, referred_id, reward_amount FROM new_rows WHERE status = 'completed' ORDER BY id LOOP
+        PERFORM add_referral_edge(r.referrer_id, r.referred_id, r.reward_amount);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_referrals_tree AFTER INSERT ON referrals
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION referrals_to_tree();
+
+CREATE OR REPLACE FUNCTION referral_summary(p_user_id VARCHAR) RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+               'directCount', COALESCE(t.direct_count, 0),
+               'downlineSize', COALESCE(t.downline_size, 0),
+               'maxDepth', COALESCE(t.max_depth, 0),
+               'rewards', COALESCE(t.rewards, 0)::text,
+               'levels', COALESCE((
+                   SELECT jsonb_agg(jsonb_build_object('depth', l.depth, 'members', l.members, 'rewards', l.rewards::text)
+                                    ORDER BY l.depth)
+                     FROM referral_levels l
+                    WHERE l.ancestor_id = p_user_id
+               ), '[]'::jsonb)
+           )
+      FROM (SELECT 1) AS one
+      LEFT JOIN referral_totals t ON t.user_id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT DISTINCT ON (referred_id) referrer_id, referred_id, reward_amount
+               FROM referrals
+              WHERE status = 'completed'
+              ORDER BY referred_id, created_at, id LOOP
+        PERFORM add_referral_edge(r.referrer_id, r.referred_id, r.reward_amount);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,53 @@
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS attempts SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS payout_ref VARCHAR(100);
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS failure_reason TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_withdraw_queue ON transactions(created_at)
+    WHERE type = 'withdraw' AND status IN ('pending', 'processing');
+
+-- A pending withdrawal holds the funds in system:payout_pending until the worker settles or reverses it
+CREATE OR REPLACE FUNCTION post_transactions_to_ledger() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO ledger_entries (transaction_id, account, kind, amount)
+    SELECT t.id, leg.account, t.type, leg.amount
+      FROM new_rows t
+     CROSS JOIN LATERAL (VALUES
+         (t.user_id, CASE WHEN t.type = 'withdraw' THEN -t.amount ELSE t.amount END),
+         (CASE t.type
+              WHEN 'topup' THEN 'system:topup'
+              WHEN 'withdraw' THEN CASE WHEN t.status = 'completed' THEN 'system:payout' ELSE 'system:payout_pending' END
+              WHEN 'adjustment' THEN 'system:adjustment'
+              ELSE 'system:bonus'
+          END,
+          CASE WHEN t.type = 'withdraw' THEN t.amount ELSE -t.amount END)
+     ) AS leg(account, amount)
+     WHERE t.status = 'completed' OR (t.type = 'withdraw' AND t.status = 'pending');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION settle_withdrawals_in_ledger() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO ledger_entries (transaction_id, account, kind, amount)
+    SELECT n.id, leg.account, leg.kind, leg.amount
+      FROM new_rows n
+      JOIN old_rows o ON o.id = n.id
+     CROSS JOIN LATERAL (VALUES
+         ('system:payout_pending',
+          CASE WHEN n.status = 'completed' THEN 'withdraw_settle' ELSE 'withdraw_reversal' END,
+          -n.amount),
+         (CASE WHEN n.status = 'completed' THEN 'system:payout' ELSE n.user_id END,
+          CASE WHEN n.status = 'completed' THEN 'withdraw_settle' ELSE 'withdraw_reversal' END,
+          n.amount)
+     ) AS leg(account, kind, amount)
+     WHERE n.type = 'withdraw'
+       AND o.status IN ('pending', 'processing')
+       AND n.status IN ('completed', 'failed');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_transactions_ledger_update AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION settle_withdrawals_in_ledger();
@@ -0,0 +1,14 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION users_search_text(p_user_id VARCHAR, p_username VARCHAR, p_first_name VARCHAR, p_last_name VARCHAR)
+RETURNS TEXT AS $$
+    SELECT lower(p_user_id || ' ' || COALESCE(p_username, '') || ' ' || COALESCE(p_first_name, '') || ' ' || COALESCE(p_last_name, ''));
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- GiST rather than GIN so the same index serves both the substring filter and the <-> distance ordering
+CREATE INDEX IF NOT EXISTS idx_users_search_trgm
+    ON users USING gist (users_search_text(user_id, username, first_name, last_name) gist_trgm_ops);
+
+-- Queries shorter than a trigram fall back to prefix matches on the identifiers
+CREATE INDEX IF NOT EXISTS idx_users_user_id_prefix ON users (lower(user_id) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_prefix ON users (lower(username) text_pattern_ops);
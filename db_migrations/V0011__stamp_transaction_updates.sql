@@ -0,0 +1,16 @@
+-- Status changes (withdrawal claims and settlements) are the only updates of transactions; stamping them lets the
+-- wallet version be read from indexes instead of being maintained on the users row
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id_updated_at ON transactions(user_id, updated_at)
+    WHERE updated_at IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION stamp_transaction_update() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_transactions_stamp_update BEFORE UPDATE ON transactions
+    FOR EACH ROW EXECUTE FUNCTION stamp_transaction_update();
@@ -0,0 +1,40 @@
+-- Shared token buckets for RATE_LIMIT_BACKEND=postgres; losing them on a crash only resets the limits
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket_key VARCHAR(300) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at ON rate_limit_buckets(updated_at);
+
+-- Refills the bucket, takes one token if available and returns 0, otherwise returns the seconds until one refills
+CREATE OR REPLACE FUNCTION take_rate_limit_token(p_key VARCHAR, p_rate DOUBLE PRECISION, p_burst DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION AS $$
+DECLARE
+    available DOUBLE PRECISION;
+BEGIN
+    INSERT INTO rate_limit_buckets AS b (bucket_key, tokens, updated_at)
+    VALUES (p_key, p_burst, clock_timestamp())
+    ON CONFLICT (bucket_key) DO UPDATE
+        SET tokens = LEAST(p_burst, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * p_rate),
+            updated_at = clock_timestamp()
+    RETURNING tokens INTO available;
+
+    IF available >= 1 THEN
+        UPDATE rate_limit_buckets SET tokens = tokens - 1 WHERE bucket_key = p_key;
+        RETURN 0;
+    END IF;
+    RETURN (1 - available) / p_rate;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Buckets idle long enough to be full again carry no state and can be dropped
+CREATE OR REPLACE FUNCTION purge_rate_limit_buckets(p_idle INTERVAL DEFAULT INTERVAL '1 hour') RETURNS INTEGER AS $$
+DECLARE
+    purged INTEGER;
+BEGIN
+    DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - p_idle;
+    GET DIAGNOSTICS purged = ROW_COUNT;
+    RETURN purged;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,5 @@
+-- Debits of one account serialize on its users row instead of an advisory lock. Row locks live in the tuple
+-- rather than the shared lock table, so bulk adjustments can lock any number of accounts in one transaction.
+CREATE OR REPLACE FUNCTION lock_ledger_account(p_account VARCHAR) RETURNS VOID AS $$
+    SELECT FROM users WHERE user_id = p_account FOR NO KEY UPDATE;
+$$ LANGUAGE sql;
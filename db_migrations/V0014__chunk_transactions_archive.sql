@@ -0,0 +1,14 @@
+-- Archives are stored as a sequence of gzip members so a month can be exported in bounded chunks;
+-- concatenated in chunk order they form a single valid gzip stream
+CREATE TABLE IF NOT EXISTS transactions_archive_chunks (
+    partition_name VARCHAR(50) NOT NULL REFERENCES transactions_archive(partition_name) ON DELETE CASCADE,
+    chunk_no INTEGER NOT NULL,
+    rows_count BIGINT NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (partition_name, chunk_no)
+);
+
+INSERT INTO transactions_archive_chunks (partition_name, chunk_no, rows_count, data)
+SELECT partition_name, 0, rows_count, data FROM transactions_archive;
+
+ALTER TABLE transactions_archive DROP COLUMN data;
@@ -0,0 +1,2 @@
+-- Retried payouts wait an exponentially growing delay before they can be claimed again
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
@@ -0,0 +1,2 @@
+-- Serves max(id) per user for the wallet summary version
+CREATE INDEX IF NOT EXISTS idx_transactions_user_id_id ON transactions(user_id, id);
@@ -0,0 +1,36 @@
+const TOKEN_KEY = 'sessionToken';
+const EXPIRES_KEY = 'sessionExpiresAt';
+const LAST_WRITE_KEY = 'lastWriteAt';
+
+export function saveSession(token?: string | null, expiresAt?: number | null) {
+  if (token && expiresAt) {
+    localStorage.setItem(TOKEN_KEY, token);
+    localStorage.setItem(EXPIRES_KEY, String(expiresAt));
+  } else {
+    localStorage.removeItem(TOKEN_KEY);
+    localStorage.removeItem(EXPIRES_KEY);
+  }
+}
+
+export function rememberWrite(response: Response) {
+  const lastWrite = response.headers.get('X-Last-Write');
+  if (lastWrite) {
+    localStorage.setItem(LAST_WRITE_KEY, lastWrite);
+  }
+}
+
+export function sessionHeaders(): Record<string, string> {
+  const headers: Record<string, string> = {};
+  const token = localStorage.getItem(TOKEN_KEY);
+  const expiresAt = Number(localStorage.getItem(EXPIRES_KEY) || 0);
+  const lastWrite = localStorage.getItem(LAST_WRITE_KEY);
+
+  if (token && expiresAt * 1000 > Date.now()) {
+    headers['X-Session-Token'] = token;
+  }
+  if (lastWrite) {
+    headers['X-Last-Write'] = lastWrite;
+  }
+
+  return headers;
+}
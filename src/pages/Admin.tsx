@@ -7,6 +7,7 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
+import { rememberWrite, sessionHeaders } from '@/lib/session';
 import { useNavigate } from 'react-router-dom';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
@@ -29,6 +30,7 @@ export default function Admin() {
   });
   
   const [users, setUsers] = useState<any[]>([]);
+  const [userSearch, setUserSearch] = useState('');
   const [transactions, setTransactions] = useState<any[]>([]);
   
   const [selectedUser, setSelectedUser] = useState<any>(null);
@@ -54,7 +56,7 @@ export default function Admin() {
     try {
       const response = await fetch(AUTH_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
         body: JSON.stringify({ action: 'check_admin', userId: uid })
       });
       
@@ -79,7 +81,7 @@ export default function Admin() {
   const fetchStats = async () => {
     try {
       const response = await fetch(`${ADMIN_API}?action=stats`, {
-        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '' }
+        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '', ...sessionHeaders() }
       });
       const data = await response.json();
       setStats(data);
@@ -91,7 +93,7 @@ export default function Admin() {
   const fetchUsers = async () => {
     try {
       const response = await fetch(`${ADMIN_API}?action=users&limit=100`, {
-        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '' }
+        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '', ...sessionHeaders() }
       });
       const data = await response.json();
       setUsers(data.users || []);
@@ -100,10 +102,26 @@ export default function Admin() {
     }
   };
 
+  const searchUsers = async (query: string) => {
+    if (!query.trim()) {
+      fetchUsers();
+      return;
+    }
+    try {
+      const response = await fetch(`${ADMIN_API}?action=search&limit=50&q=${encodeURIComponent(query.trim())}`, {
+        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '', ...sessionHeaders() }
+      });
+      const data = await response.json();
+      setUsers(data.users || []);
+    } catch (error) {
+      toast.error('Ошибка поиска пользователей');
+    }
+  };
+
   const fetchTransactions = async () => {
     try {
       const response = await fetch(`${ADMIN_API}?action=transactions&limit=100`, {
-        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '' }
+        headers: { 'X-Admin-Id': userId || localStorage.getItem('userId') || '', ...sessionHeaders() }
       });
       const data = await response.json();
       setTransactions(data.transactions || []);
@@ -124,7 +142,8 @@ export default function Admin() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'X-Admin-Id': userId
+          'X-Admin-Id': userId,
+          ...sessionHeaders()
         },
         body: JSON.stringify({
           action: 'add_bonus',
@@ -135,6 +154,7 @@ export default function Admin() {
         })
       });
 
+      rememberWrite(response);
       const data = await response.json();
 
       if (data.success) {
@@ -234,6 +254,22 @@ export default function Admin() {
                 <CardDescription>Список зарегистрированных пользователей</CardDescription>
               </CardHeader>
               <CardContent>
+                <form
+                  className="flex gap-2 mb-4"
+                  onSubmit={(e) => {
+                    e.preventDefault();
+                    searchUsers(userSearch);
+                  }}
+                >
+                  <Input
+                    placeholder="ID, username, имя или Telegram ID"
+                    value={userSearch}
+                    onChange={(e) => setUserSearch(e.target.value)}
+                  />
+                  <Button type="submit" variant="outline">
+                    <Icon name="Search" size={16} />
+                  </Button>
+                </form>
                 <Table>
                   <TableHeader>
                     <TableRow>
@@ -10,6 +10,7 @@ import Icon from '@/components/ui/icon';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { toast } from 'sonner';
+import { rememberWrite, saveSession, sessionHeaders } from '@/lib/session';
 
 const API_URL = 'https://functions.poehali.dev/4ee0098d-e446-453c-a5c1-294b06ce09f1';
 const AUTH_API = 'https://functions.poehali.dev/2abe086a-57e0-45bb-87f5-702189437488';
@@ -64,6 +65,7 @@ export default function Index() {
         setUserId(newUserId);
         localStorage.setItem('userId', newUserId);
         localStorage.setItem('telegramUser', JSON.stringify(user));
+        saveSession(data.token, data.expiresAt);
         setIsAuthenticated(true);
         setIsAdmin(data.user.is_admin || false);
         toast.success(`Добро пожаловать, ${user.first_name}!`);
@@ -80,7 +82,7 @@ export default function Index() {
     try {
       const response = await fetch(AUTH_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
         body: JSON.stringify({ action: 'check_admin', userId: uid })
       });
       const data = await response.json();
@@ -95,7 +97,9 @@ export default function Index() {
     if (!targetUserId) return;
     
     try {
-      const response = await fetch(`${API_URL}?userId=${targetUserId}`);
+      const response = await fetch(`${API_URL}?userId=${targetUserId}`, {
+        headers: sessionHeaders()
+      });
       const data = await response.json();
       
       if (data.user) {
@@ -124,7 +128,7 @@ export default function Index() {
     try {
       const response = await fetch(API_URL, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
         body: JSON.stringify({
           action: 'withdraw',
           userId,
@@ -134,6 +138,7 @@ export default function Index() {
         })
       });
       
+      rememberWrite(response);
       const data = await response.json();
       
       if (data.success) {
@@ -165,7 +170,7 @@ export default function Index() {
       try {
         const response = await fetch(API_URL, {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
+          headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
           body: JSON.stringify({
             action: 'topup',
             userId,
@@ -173,6 +178,7 @@ export default function Index() {
           })
         });
         
+        rememberWrite(response);
         const data = await response.json();
         
         if (data.success) {